@@ -1,16 +1,33 @@
 import argparse
+import copy
+import ctypes
+import ctypes.util
+import filecmp
+import fnmatch
+import hashlib
+import heapq
 import os
 import json
+import select
+import shutil
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import git
 import logging
 import locale
+import re
+import shlex
 
 from logging.handlers import TimedRotatingFileHandler
+from xml.etree import ElementTree
 from datetime import datetime
 import multiprocessing
 from multiprocessing import Process
+from multiprocessing.pool import ThreadPool
 from time import sleep
 
 
@@ -21,6 +38,9 @@ class OCcommand:
     desc: str
     successful_msg: str
     ignore_msg: bool
+    backend: str
+    watch_path: str
+    watch_key: str
 
     def __init__(self) -> None:
         self.command_line = ''
@@ -28,6 +48,11 @@ class OCcommand:
         self.desc = ''
         self.successful_msg = ''
         self.ignore_msg = False
+        self.backend = 'designer'
+        # папка, за заполнением которой наблюдается во время выполнения команды,
+        # и ключ статистики предыдущих выполнений для оценки времени завершения
+        self.watch_path = ''
+        self.watch_key = ''
 
 
 # организуем параллельность загрузки конфигурации
@@ -88,6 +113,9 @@ def main_log_listener(conf: dict, queue: multiprocessing.Queue, log_listener_on:
 
 
 def subprocess_logger_config(conf: dict, queue: multiprocessing.Queue):    
+    # без очереди дочерний процесс пишет в обработчики, унаследованные от родителя
+    if queue is None:
+        return
     logger_id = curr_logger_id()
     log_cfg = conf['logging']
     handler = logging.handlers.QueueHandler(queue)
@@ -101,6 +129,18 @@ def start_main_logger(conf: dict, queue: multiprocessing.Queue, log_listener_on:
     listener.start()
     return listener
 
+# записывает метрику в файл метрик (json lines), если он задан в настройках.
+# файл дополняется из разных процессов, поэтому каждая метрика пишется одной строкой
+def write_metric(conf: dict, name: str, data: dict):
+    metrics_path = conf.get('metrics', dict()).get('path', '')
+    if metrics_path == '':
+        return
+
+    record = {'time': datetime.now().isoformat(), 'pid': os.getpid(), 'name': name}
+    record.update(data)
+    with open(metrics_path, mode='a', encoding='utf-8') as metrics_file:
+        metrics_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
 # завершение секции логирования
 
 
@@ -129,36 +169,146 @@ def get_onec_command_line(conf, start_type: str) -> str:
         if info_base['password'] != '':
             password = '/P{}'.format(info_base['password'])
 
+    # ключи /Out и /DumpResult добавляются при выполнении команды,
+    # т.к. файлы вывода у каждого запуска 1С свои
     onec_command_line = '{start_path} {start_type} {wa_flag} /DisableStartupDialogs {user_name} ' \
                         '{passwd} /L ru /VL ru /IBConnectionString "{connection_string}" ' \
-                        '/Out "{log_path}" /DumpResult "{result_path}"' \
                         ' '.format(start_path=onec['start_path'],
                                    start_type=start_type,
                                    wa_flag=wa,
                                    user_name=user,
                                    passwd=password,
                                    # 1C требует двойных кавычек внутри строки
-                                   connection_string=info_base['connection_string'].replace('"', '""'),
-                                   log_path=onec['log_file_path'],
-                                   result_path=onec['result_dump_path'])
+                                   connection_string=info_base['connection_string'].replace('"', '""'))
     return onec_command_line
 
 
+# способ выполнения команд загрузки из хранилища, восстановления базы и выгрузки в файлы:
+# designer - конфигуратор 1cv8, ibcmd - автономная утилита ibcmd,
+# которая запускается быстрее и не требует графического окружения
+def get_backend(conf: dict) -> str:
+    return conf['onec'].get('backend', 'designer')
+
+
+FILE_INFOBASE_PATTERN = re.compile(r'File\s*=\s*"?([^";]+)"?', re.IGNORECASE)
+
+
+# признак файловой информационной базы в строке соединения
+def is_file_infobase(conf: dict) -> bool:
+    return FILE_INFOBASE_PATTERN.search(conf['info_base']['connection_string']) is not None
+
+
+# путь к файловой информационной базе из строки соединения
+def get_file_infobase_path(conf: dict) -> str:
+    connection_string = conf['info_base']['connection_string']
+    match = FILE_INFOBASE_PATTERN.search(connection_string)
+    if match is None:
+        raise ValueError(f'Строка соединения не описывает файловую базу; {connection_string}')
+
+    return match.group(1)
+
+
+# формирует командную строку ibcmd с параметрами подключения к информационной базе.
+# Для клиент-серверной базы параметры подключения к СУБД задаются в onec/ibcmd_connection
+def get_ibcmd_command_line(conf: dict, command: str) -> str:
+    onec = conf['onec']
+    info_base = conf['info_base']
+    connection = onec.get('ibcmd_connection', '')
+    if connection == '':
+        connection = f'--db-path="{get_file_infobase_path(conf)}"'
+
+    user = ''
+    if not info_base['windows_auth']:
+        user = f'--user="{info_base["user"]}"'
+        if info_base['password'] != '':
+            user += f' --password="{info_base["password"]}"'
+
+    return f'"{onec["ibcmd_path"]}" {command} {connection} {user}'
+
+
+# параметр ibcmd, указывающий, что команда выполняется для расширения конфигурации
+def get_ibcmd_extension_param(conf: dict) -> str:
+    extension = get_source_name(conf)
+    if extension == '':
+        return ''
+
+    return f'--extension="{extension}"'
+
+
+def ibcmd_restore_bd_configuration_command(conf: dict) -> OCcommand:
+    oc_command = OCcommand()
+    oc_command.backend = 'ibcmd'
+    oc_command.command_line = get_ibcmd_command_line(conf, 'infobase restore') + \
+        f' "{conf["info_base"]["empty_db_path"]}"'
+    oc_command.desc = 'Восстановление конфигурации'
+    oc_command.time_out = conf['onec']['timeout']
+    return oc_command
+
+
+def ibcmd_update_to_storage_version_command(conf: dict, version_for_load: int) -> OCcommand:
+    storage = conf['storage']
+    passwd_flag = ''
+    if storage['password'] != '':
+        passwd_flag = f'--repository-password="{storage["password"]}"'
+
+    update_params = f'--repository-path="{storage["path"]}" --repository-user="{storage["user"]}" ' \
+                    f'{passwd_flag} --version={version_for_load} --force {get_ibcmd_extension_param(conf)}'
+
+    oc_command = OCcommand()
+    oc_command.backend = 'ibcmd'
+    oc_command.command_line = get_ibcmd_command_line(conf, 'infobase config repository update') + ' ' + update_params
+    oc_command.desc = 'Обновление из хранилища'
+    oc_command.time_out = conf['onec']['update_timeout']
+    return oc_command
+
+
+# инкрементная выгрузка ibcmd сравнивает конфигурацию с ConfigDumpInfo.xml
+# предыдущей выгрузки, --sync удаляет файлы удаленных объектов
+def ibcmd_dump_configuration_to_git_command(conf: dict, first_dump: bool, ver: int) -> OCcommand:
+    onec = conf['onec']
+    src_path = conf['git']['configuration_src_path']
+    dump_params = get_ibcmd_extension_param(conf)
+    if not first_dump:
+        dump_params += ' --sync --base="{}"'.format(os.path.join(src_path, 'ConfigDumpInfo.xml'))
+    if onec.get('ibcmd_threads', 0) > 0:
+        dump_params += f' --threads={onec["ibcmd_threads"]}'
+
+    oc_command = OCcommand()
+    oc_command.backend = 'ibcmd'
+    oc_command.command_line = get_ibcmd_command_line(conf, 'infobase config export') + \
+        f' {dump_params} "{src_path}"'
+    oc_command.watch_path = src_path
+    oc_command.watch_key = get_dump_stats_key(conf, first_dump)
+    oc_command.desc = f'Выгрузка в git {ver}'
+    oc_command.time_out = onec['dump_timeout']
+    return oc_command
+
+
+# аргументы запуска процесса. В Windows командная строка передается как есть,
+# в остальных ОС разбирается на аргументы, т.к. subprocess не выполняет разбор строки
+def get_command_args(command_line: str):
+    if os.name == 'nt':
+        return command_line
+
+    return shlex.split(command_line)
+
+
 # общая функция чтения лог файла 1С
 # при выполнениее команды 1С могут быть сформированы два
 # лог файла out.txt и result.txt
 # имена файлов задаются ключами при запуске
-def read_oc_log_file(log_path: str):
+def read_oc_log_file(log_path: str, remove: bool = True):
     logger = logging.getLogger(curr_logger_id())
     log_data = ''
     try:
         if os.path.exists(log_path):
             with open(log_path, 'r', encoding="utf_8_sig") as oc_log:
                 log_data = oc_log.read().rstrip()
-            try:
-                os.remove(log_path)
-            except Exception:
-                logger.exception("Ошибка удаления лога 1С")
+            if remove:
+                try:
+                    os.remove(log_path)
+                except Exception:
+                    logger.exception("Ошибка удаления лога 1С")
     except Exception:
         log_data = "Ошибка чтения лога 1С."
         logger.exception(log_data)
@@ -167,7 +317,9 @@ def read_oc_log_file(log_path: str):
 
 
 # Читает лог выполнения операции при запуске 1С
-# в пакетном режиме
+# в пакетном режиме из файла onec/log_file_path.
+# Команды скрипта пишут вывод в отдельные папки запуска (create_command_work_dir),
+# общий файл используется только тестами при подготовке тестовой базы.
 # Проблема в том, что данный файл формируется не всегда.
 def read_oc_log(conf: dict) -> str:
     log_path = conf['onec']['log_file_path']
@@ -175,35 +327,506 @@ def read_oc_log(conf: dict) -> str:
     return oc_msg
 
 
-# Читает результат выполнения операции при запуске 1С
-# в пакетном режиме. В файле либо 0 - успех
-# либо 1 - ошибка.
-# Проблема в том, что данный файл формируется не всегда.
-def read_oc_result(conf: dict) -> int:
-    log_path = conf['onec']['result_dump_path']
-    oc_result = read_oc_log_file(log_path)
+def get_oc_result(oc_result: str) -> int:
     if oc_result != '1':
         return 0
     else:
         return 1
 
 
+# создает отдельную папку для файлов вывода одного запуска 1С,
+# чтобы одновременно выполняемые команды не читали результаты друг друга.
+# Папки создаются в onec/work_path или, если он не задан, рядом с onec/log_file_path
+def create_command_work_dir(conf: dict) -> str:
+    onec = conf['onec']
+    work_path = onec.get('work_path', '')
+    if work_path == '':
+        work_path = os.path.dirname(onec['log_file_path'])
+    os.makedirs(work_path, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f'onec_{os.getpid()}_', dir=work_path)
+
+
+# выполняет команду ibcmd. Утилита не формирует файлы /Out и /DumpResult,
+# результат определяется по коду возврата, вывод утилиты пишется в лог
+def execute_ibcmd_command(conf: dict, oc_command: OCcommand):
+    logger = logging.getLogger(curr_logger_id())
+    logger.info("Команда: %s", oc_command.command_line)
+    watcher = start_dump_watcher(conf, oc_command)
+    try:
+        result = subprocess.run(get_command_args(oc_command.command_line), shell=False,
+                                timeout=oc_command.time_out, capture_output=True)
+    finally:
+        stop_dump_watcher(watcher)
+    encoding = locale.getpreferredencoding(False)
+    oc_msg = (result.stdout + result.stderr).decode(encoding, errors='replace').rstrip()
+    logger.info(f'Сообщение ibcmd: {oc_msg}')
+    logger.info(f'Завершено: {oc_command.desc}')
+    if result.returncode != 0:
+        err_desc = f'Выполненение:{oc_command.desc}; команда:{oc_command.command_line}, ' \
+                   f'завершено с ошибкой, код {result.returncode}'
+        raise ValueError(err_desc)
+
+    save_dump_stats(conf, watcher)
+
+
+# выполняет команду 1С. Файлы /Out и /DumpResult формируются в папке запуска,
+# при успешном выполнении папка удаляется, при ошибке сохраняется для анализа
 def execute_command(conf: dict, oc_command: OCcommand):
     logger = logging.getLogger(curr_logger_id())
     logger.info(f'Начало: {oc_command.desc}')
-    logger.info("Команда: %s", oc_command.command_line)
-    subprocess.run(oc_command.command_line, shell=False, timeout=oc_command.time_out)
-    oc_msg = read_oc_log(conf)
-    oc_res = read_oc_result(conf)
+    if oc_command.backend == 'ibcmd':
+        execute_ibcmd_command(conf, oc_command)
+        return
+
+    work_dir = create_command_work_dir(conf)
+    log_path = os.path.join(work_dir, 'out.txt')
+    result_path = os.path.join(work_dir, 'result.txt')
+    command_line = f'{oc_command.command_line} /Out "{log_path}" /DumpResult "{result_path}"'
+    logger.info("Команда: %s", command_line)
+    watcher = start_dump_watcher(conf, oc_command)
+    try:
+        subprocess.run(get_command_args(command_line), shell=False, timeout=oc_command.time_out)
+    except Exception:
+        logger.error(f'Файлы вывода 1С сохранены; {work_dir}')
+        raise
+    finally:
+        stop_dump_watcher(watcher)
+    oc_msg = read_oc_log_file(log_path, remove=False)
+    oc_res = get_oc_result(read_oc_log_file(result_path, remove=False))
     logger.info(f'Сообщение 1С: {oc_msg}')
     logger.info(f'Завершено: {oc_command.desc}')
     if oc_res != 0 or (oc_msg != oc_command.successful_msg and (not oc_command.ignore_msg)):
+        logger.error(f'Файлы вывода 1С сохранены; {work_dir}')
         err_desc = f'Выполненение:{oc_command.desc}; команда:{oc_command.command_line}, завершено с ошибкой '
         raise ValueError(err_desc)
 
+    save_dump_stats(conf, watcher)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# последовательно выполняет задачи одной базы-приемника в дочернем процессе
+def run_receiver_tasks(target, tasks: list, queue: multiprocessing.Queue):
+    subprocess_logger_config(tasks[0][0], queue)
+    for task in tasks:
+        target(*task)
+
+
+# выполняет задачи по источникам истории. Первый элемент задачи - настройки источника.
+# Задачи разных баз-приемников выполняются параллельно в дочерних процессах,
+# задачи одной базы - последовательно, т.к. конфигуратор монопольно блокирует базу
+def run_on_receivers(target, tasks: list, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    groups = dict()
+    for task in tasks:
+        groups.setdefault(get_receiver_key(task[0]), list()).append(task)
+
+    if len(groups) == 1:
+        for task in tasks:
+            target(*task)
+        return
+
+    processes = list()
+    for receiver_key, receiver_tasks in groups.items():
+        logger.info(f'Запуск задач базы-приемника; {receiver_key}; {len(receiver_tasks)}')
+        process = Process(target=run_receiver_tasks, args=(target, receiver_tasks, queue))
+        process.start()
+        processes.append(process)
+
+    for process in processes:
+        process.join()
+
+    failed = [process.pid for process in processes if process.exitcode != 0]
+    if failed:
+        raise ValueError(f'Ошибка выполнения задач баз-приемников; процессы: {failed}')
+
 # завершение блока обработки команд 1С
 
 
+# блок наблюдения за выгрузкой
+# во время выгрузки в файлы 1С не сообщает о ходе выполнения, поэтому
+# за папкой выгрузки наблюдает отдельный поток: в Linux через inotify,
+# в остальных случаях периодическим обходом папки. Поток сообщает в лог
+# и в файл метрик количество записанных файлов, скорость записи, оценку
+# завершения по количеству файлов предыдущей выгрузки и отсутствие записи
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+POLL_TIME_SLACK_NS = 50000000
+
+
+class DumpProgressWatcher(threading.Thread):
+    """Наблюдает за папкой выгрузки во время работы 1С"""
+    conf: dict
+    watch_path: str
+    watch_key: str
+    desc: str
+    written: set
+    polled_count: int
+    start_ns: int
+
+    def __init__(self, conf: dict, oc_command: OCcommand) -> None:
+        super().__init__(daemon=True)
+        onec = conf['onec']
+        self.conf = conf
+        self.watch_path = oc_command.watch_path
+        self.watch_key = oc_command.watch_key
+        self.desc = oc_command.desc
+        self.interval = onec.get('progress_interval', 0)
+        self.stall_seconds = onec.get('stall_seconds', 600)
+        self.expected = read_dump_stats(conf).get(self.watch_key, 0)
+        self.written = set()
+        self.polled_count = 0
+        self.polling = True
+        self.inotify_fd = None
+        self.watches = dict()
+        self.root_wd = None
+        self.start_ns = time.time_ns()
+        self.stop_event = threading.Event()
+
+    # количество файлов, записанных с начала выгрузки
+    def written_count(self) -> int:
+        if self.polling:
+            return self.polled_count
+        return len(self.written)
+
+    # наблюдение устанавливается до запуска 1С, чтобы не пропустить первые файлы
+    def start(self) -> None:
+        if sys.platform.startswith('linux'):
+            try:
+                self.start_inotify()
+            except OSError as ex:
+                logger = logging.getLogger(curr_logger_id())
+                logger.info(f'inotify недоступен, используется обход папки выгрузки; {ex}')
+                self.close_inotify()
+                self.polling = True
+        super().start()
+
+    def run(self) -> None:
+        logger = logging.getLogger(curr_logger_id())
+        last_report = time.monotonic()
+        last_count = 0
+        last_change = last_report
+        stall_reported = False
+        while not self.stop_event.is_set():
+            if not self.polling:
+                self.read_inotify_events(min(self.interval, 1))
+            elif self.stop_event.wait(self.interval):
+                break
+            else:
+                self.poll()
+
+            now = time.monotonic()
+            if now - last_report < self.interval:
+                continue
+
+            count = self.written_count()
+            if count != last_count:
+                last_change = now
+                stall_reported = False
+            elif now - last_change >= self.stall_seconds and not stall_reported:
+                stall_reported = True
+                logger.warning(f'Нет записи файлов выгрузки {int(now - last_change)} сек; {self.desc}')
+                write_metric(self.conf, 'dump_stall', {'desc': self.desc, 'seconds': int(now - last_change)})
+            self.report(count, (count - last_count) / (now - last_report))
+            last_report = now
+            last_count = count
+
+        if self.polling:
+            self.poll()
+        else:
+            # события, полученные до остановки наблюдения
+            self.read_inotify_events(0)
+        self.close_inotify()
+
+    def report(self, count: int, rate: float):
+        logger = logging.getLogger(curr_logger_id())
+        elapsed = (time.time_ns() - self.start_ns) / 1e9
+        eta = None
+        if self.expected > count and count > 0:
+            eta = int((self.expected - count) / (count / elapsed))
+        progress = {'desc': self.desc, 'files': count, 'files_per_second': round(rate, 1),
+                    'expected_files': self.expected, 'eta_seconds': eta}
+        logger.info(f'Ход выгрузки; {progress}')
+        write_metric(self.conf, 'dump_progress', progress)
+
+    # подсчет файлов, измененных с начала выгрузки, обходом папки
+    def poll(self):
+        count = 0
+        for root, _, files in os.walk(self.watch_path):
+            for file_name in files:
+                try:
+                    # время изменения файла записывается с точностью системного таймера
+                    if os.stat(os.path.join(root, file_name)).st_mtime_ns >= self.start_ns - POLL_TIME_SLACK_NS:
+                        count += 1
+                except OSError:
+                    pass
+        self.polled_count = count
+
+    def start_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.libc = libc
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self.inotify_fd = fd
+        self.polling = False
+        os.makedirs(self.watch_path, exist_ok=True)
+        self.add_watch_tree(self.watch_path, False)
+        self.root_wd = next(iter(self.watches))
+
+    def close_inotify(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    # переход на подсчет обходом папки
+    def fall_back_to_polling(self):
+        self.close_inotify()
+        self.polling = True
+        self.poll()
+
+    # добавляет наблюдение за папкой и вложенными папками.
+    # файлы новой папки могли быть записаны до начала наблюдения, поэтому они учитываются сразу
+    def add_watch_tree(self, path: str, count_files: bool):
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for root, _, files in os.walk(path):
+            wd = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(root), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch {root}')
+            self.watches[wd] = root
+            if count_files:
+                self.written.update(os.path.join(root, file_name) for file_name in files)
+
+    # читает события не дольше timeout секунд, чтобы при непрерывной записи файлов
+    # поток успевал выводить ход выгрузки и проверять остановку.
+    # при нулевом timeout читаются все накопленные события
+    def read_inotify_events(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while not self.polling:
+            ready, _, _ = select.select([self.inotify_fd], [], [], max(deadline - time.monotonic(), 0))
+            if not ready:
+                return
+            try:
+                data = os.read(self.inotify_fd, 65536)
+            except BlockingIOError:
+                return
+            self.process_inotify_events(data)
+            if timeout > 0 and (self.stop_event.is_set() or time.monotonic() >= deadline):
+                return
+
+    def process_inotify_events(self, data: bytes):
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+            name = os.fsdecode(data[pos + INOTIFY_EVENT.size:pos + INOTIFY_EVENT.size + length].rstrip(b'\0'))
+            pos += INOTIFY_EVENT.size + length
+            # переполнение очереди событий или удаление папки выгрузки:
+            # дальнейший подсчет выполняется обходом папки
+            if mask & IN_Q_OVERFLOW or (mask & IN_IGNORED and wd == self.root_wd):
+                self.fall_back_to_polling()
+                return
+            dir_path = self.watches.get(wd)
+            if dir_path is None or name == '':
+                continue
+            path = os.path.join(dir_path, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self.add_watch_tree(path, True)
+                    except OSError:
+                        self.fall_back_to_polling()
+                        return
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.written.add(path)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+
+# ключ статистики выгрузки: источник истории и вид выгрузки
+def get_dump_stats_key(conf: dict, first_dump: bool) -> str:
+    return '{}:{}'.format(get_source_name(conf), 'full' if first_dump else 'update')
+
+
+def get_dump_stats_path(conf: dict) -> str:
+    default_path = os.path.join(os.path.dirname(conf['storage']['version_path']), 'dump_stats.json')
+    return conf['onec'].get('dump_stats_path', default_path)
+
+
+def read_dump_stats(conf: dict) -> dict:
+    try:
+        return read_json_file(get_dump_stats_path(conf))
+    except (OSError, ValueError):
+        return dict()
+
+
+# наблюдение включается параметром onec/progress_interval, т.к. без inotify
+# (в Windows) каждый интервал выполняется обход всей папки выгрузки
+def start_dump_watcher(conf: dict, oc_command: OCcommand):
+    if oc_command.watch_path == '' or conf['onec'].get('progress_interval', 0) <= 0:
+        return None
+
+    watcher = DumpProgressWatcher(conf, oc_command)
+    watcher.start()
+    return watcher
+
+
+def stop_dump_watcher(watcher):
+    if watcher is not None:
+        watcher.stop()
+
+
+# сохраняет количество файлов успешной выгрузки для оценки следующих выгрузок
+def save_dump_stats(conf: dict, watcher):
+    if watcher is None:
+        return
+
+    count = watcher.written_count()
+    stats = read_dump_stats(conf)
+    stats[watcher.watch_key] = count
+    write_json_file(get_dump_stats_path(conf), stats)
+    write_metric(conf, 'dump_finished', {'desc': watcher.desc, 'files': count})
+
+# завершение блока наблюдения за выгрузкой
+
+
+# блок пула баз-приемников
+# восстановление файловой базы из выгрузки занимает минуты, поэтому
+# восстановленная база сохраняется как эталон (golden), а базы-приемники
+# получаются копированием папки эталона. Заранее подготовленные копии (ready_N)
+# ожидают в папке пула и переименовываются в папку базы-приемника мгновенно,
+# после чего пул пополняется в фоновом процессе
+
+# настройки пула, пустой словарь если пул не используется
+def get_pool_options(conf: dict) -> dict:
+    return conf['info_base'].get('pool', dict())
+
+
+def get_golden_path(conf: dict) -> str:
+    return os.path.join(get_pool_options(conf)['path'], 'golden')
+
+
+# признак актуальности эталона: файл выгрузки базы и версия платформы
+def get_golden_stamp(conf: dict) -> list:
+    empty_db_path = conf['info_base']['empty_db_path']
+    stat = os.stat(empty_db_path)
+    return [empty_db_path, stat.st_size, stat.st_mtime_ns, conf['onec']['start_path']]
+
+
+def is_pool_copy_actual(conf: dict, copy_path: str) -> bool:
+    try:
+        return os.path.isdir(copy_path) and read_json_file(f'{copy_path}.json') == get_golden_stamp(conf)
+    except (OSError, ValueError):
+        return False
+
+
+# копирует папку файловой базы. В Linux и macOS используется копирование
+# с разделением блоков (reflink/clonefile), если файловая система его поддерживает
+def clone_infobase(src_path: str, dst_path: str):
+    if os.path.exists(dst_path):
+        shutil.rmtree(dst_path)
+
+    if sys.platform.startswith('linux'):
+        subprocess.run(['cp', '-R', '--reflink=auto', src_path, dst_path], check=True)
+    elif sys.platform == 'darwin':
+        subprocess.run(['cp', '-R', '-c', src_path, dst_path], check=True)
+    else:
+        shutil.copytree(src_path, dst_path)
+
+
+# создает копию эталона атомарно: копирование во временную папку и переименование.
+# признак актуальности записывается до переименования, поэтому
+# появившаяся копия всегда считается готовой
+def create_pool_copy(conf: dict, copy_path: str):
+    tmp_path = f'{copy_path}.{os.getpid()}.tmp'
+    clone_infobase(get_golden_path(conf), tmp_path)
+    write_json_file(f'{copy_path}.json', get_golden_stamp(conf))
+    try:
+        os.rename(tmp_path, copy_path)
+    except OSError:
+        # копию уже подготовил другой процесс
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+# пополняет пул готовыми копиями эталона до pool/size.
+# выполняется в фоновом процессе
+def fill_receiver_pool(conf: dict):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_pool_options(conf)
+    for num in range(options.get('size', 1)):
+        copy_path = os.path.join(options['path'], f'ready_{num}')
+        if is_pool_copy_actual(conf, copy_path):
+            continue
+        if os.path.exists(copy_path):
+            shutil.rmtree(copy_path, ignore_errors=True)
+        create_pool_copy(conf, copy_path)
+        logger.info(f'Подготовлена база-приемник в пуле; {copy_path}')
+
+
+def start_fill_receiver_pool(conf: dict):
+    process = Process(target=fill_receiver_pool, args=(conf,))
+    process.start()
+
+
+# забирает готовую копию из пула. Копия сначала атомарно переименовывается,
+# поэтому одну копию не получат два процесса
+def take_pool_copy(conf: dict, receiver_path: str) -> bool:
+    options = get_pool_options(conf)
+    for num in range(options.get('size', 1)):
+        copy_path = os.path.join(options['path'], f'ready_{num}')
+        if not is_pool_copy_actual(conf, copy_path):
+            continue
+        taken_path = f'{copy_path}.{os.getpid()}.taken'
+        try:
+            os.rename(copy_path, taken_path)
+        except OSError:
+            continue
+
+        if os.path.exists(receiver_path):
+            shutil.rmtree(receiver_path)
+        try:
+            os.rename(taken_path, receiver_path)
+        except OSError:
+            # пул и база-приемник на разных томах
+            clone_infobase(taken_path, receiver_path)
+            shutil.rmtree(taken_path, ignore_errors=True)
+        return True
+
+    return False
+
+
+# приводит базу-приемник в исходное состояние копированием эталона.
+# Если эталон отсутствует или устарел, база восстанавливается командой 1С
+# и ее папка становится новым эталоном
+def restore_receiver_from_pool(conf: dict):
+    logger = logging.getLogger(curr_logger_id())
+    receiver_path = get_file_infobase_path(conf)
+    golden_path = get_golden_path(conf)
+    os.makedirs(get_pool_options(conf)['path'], exist_ok=True)
+    if not is_pool_copy_actual(conf, golden_path):
+        logger.info(f'Создание эталона базы-приемника; {golden_path}')
+        execute_command(conf, restore_bd_configuration_command(conf))
+        clone_infobase(receiver_path, golden_path)
+        write_json_file(f'{golden_path}.json', get_golden_stamp(conf))
+    elif take_pool_copy(conf, receiver_path):
+        logger.info(f'База-приемник получена из пула; {receiver_path}')
+    else:
+        clone_infobase(golden_path, receiver_path)
+        logger.info(f'База-приемник скопирована из эталона; {receiver_path}')
+
+    start_fill_receiver_pool(conf)
+
+# завершение блока пула баз-приемников
+
+
 # подготовка данных:
 # первичная очистка основной конфигурации,
 # определение номера версии для выгрузки из хранилища
@@ -214,6 +837,7 @@ def execute_command(conf: dict, oc_command: OCcommand):
 def init_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--conf", help="set path to config file", type=str, default="")
+    parser.add_argument("--plan", help="print version triage plan without dumping", action="store_true")
     args = parser.parse_args()
 
     return args
@@ -244,6 +868,59 @@ def init_configuration() -> dict:
     return conf
 
 
+# возвращает список описаний расширений конфигурации,
+# история которых переносится в git вместе с основной конфигурацией
+def get_extensions(conf: dict) -> list:
+    return conf.get('extensions', [])
+
+
+# имя источника истории: пустая строка для основной конфигурации
+# или имя расширения
+def get_source_name(conf: dict) -> str:
+    return conf.get('extension', '')
+
+
+# параметр командной строки 1С, указывающий, что команда
+# выполняется для расширения конфигурации
+def get_extension_param(conf: dict) -> str:
+    extension = get_source_name(conf)
+    if extension == '':
+        return ''
+
+    return f'-Extension "{extension}"'
+
+
+# формирует настройки работы с расширением на основании общих настроек скрипта.
+# Хранилище, папка выгрузки и, при необходимости, база-приемник берутся
+# из описания расширения
+def get_extension_conf(conf: dict, extension: dict) -> dict:
+    ext_conf = copy.deepcopy(conf)
+    name = extension['name']
+    ext_conf['extension'] = name
+    ext_conf['storage'].update(extension['storage'])
+    ext_conf['git']['configuration_src_path'] = extension['configuration_src_path']
+    if 'info_base' in extension:
+        ext_conf['info_base'].update(extension['info_base'])
+
+    return ext_conf
+
+
+# возвращает настройки всех источников истории:
+# основная конфигурация всегда первая, далее расширения в порядке описания
+def get_history_sources(conf: dict) -> list:
+    sources = [conf]
+    for extension in get_extensions(conf):
+        sources.append(get_extension_conf(conf, extension))
+
+    return sources
+
+
+# ключ базы-приемника. Источники с одинаковым ключом
+# обрабатываются одной базой и не могут выполняться одновременно
+def get_receiver_key(conf: dict) -> str:
+    return conf['info_base']['connection_string']
+
+
 # приводит базу даных в исходное состояние перед
 # запуском скрипта. Т.к. если основная конфигурация
 # не соответсвует конфигурации базы данных запрос
@@ -252,6 +929,22 @@ def init_configuration() -> dict:
 def restore_bd_configuration(conf: dict):
     logger = logging.getLogger(curr_logger_id())
     logger.info('Начало')
+    if get_pool_options(conf) and conf['info_base']['empty_db_path'] != "":
+        restore_receiver_from_pool(conf)
+        logger.info('Завершено')
+        return
+
+    oc_command = restore_bd_configuration_command(conf)
+    execute_command(conf, oc_command)
+    logger.info('Завершено')
+
+
+# команда восстановления базы. ibcmd используется только для восстановления
+# из файла выгрузки, возврат к конфигурации БД выполняется конфигуратором
+def restore_bd_configuration_command(conf: dict) -> OCcommand:
+    if get_backend(conf) == 'ibcmd' and conf['info_base']['empty_db_path'] != "":
+        return ibcmd_restore_bd_configuration_command(conf)
+
     command_line = get_onec_command_line(conf, 'DESIGNER')
     oc_command = OCcommand()
     oc_command.desc = 'Восстановление конфигурации'
@@ -265,8 +958,18 @@ def restore_bd_configuration(conf: dict):
         oc_command.successful_msg = 'Загрузка информационной базы успешно завершена'
 
     oc_command.command_line = command_line + restore_params
-    execute_command(conf, oc_command)
-    logger.info('Завершено')
+    return oc_command
+
+
+# восстанавливает все базы-приемники, используемые источниками истории.
+# база, общая для нескольких источников, восстанавливается один раз
+def restore_receivers(sources: list):
+    restored = set()
+    for source in sources:
+        receiver_key = get_receiver_key(source)
+        if receiver_key not in restored:
+            restore_bd_configuration(source)
+            restored.add(receiver_key)
 
 # получает номер последней версии, которую удалось
 # прочитать из хранилища.
@@ -309,12 +1012,13 @@ def create_storage_report_command(conf: dict, last_version: int) -> OCcommand:
 
     report_param_str = '/ConfigurationRepositoryF "{storage_path}" ' \
                        '/ConfigurationRepositoryN {storage_user} {storage_passwd_flag} ' \
-                       '/ConfigurationRepositoryReport "{report_path}" -NBegin {ver_num} ' \
+                       '/ConfigurationRepositoryReport "{report_path}" -NBegin {ver_num} {extension} ' \
                        ' '.format(storage_path=storage['path'],
                                   storage_user=storage['user'],
                                   storage_passwd_flag=passwd_flag,
                                   report_path=storage['report_path'],
-                                  ver_num=start_version)
+                                  ver_num=start_version,
+                                  extension=get_extension_param(conf))
 
     oc_command = OCcommand()
     oc_command.command_line = command_line + ' ' + report_param_str
@@ -402,6 +1106,335 @@ def read_storage_history(conf: dict) -> dict:
     logger.info('Завершено чтение файла истории хранилища')
     return history_data
 
+
+def read_json_file(file_path: str):
+    with open(file_path, mode='r', encoding='utf-8') as json_file:
+        return json.load(json_file)
+
+
+# запись через временный файл, чтобы параллельные процессы и другие узлы
+# никогда не читали частично записанный файл
+def write_json_file(file_path: str, data):
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(tmp_path, mode='w', encoding='utf-8') as json_file:
+        json.dump(data, json_file, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+
+
+# последовательно читает элементы (ключ, значение) объекта верхнего уровня json файла,
+# не загружая файл целиком. В памяти находится только текущий элемент
+def iter_json_object_items(json_file, chunk_size: int = 1 << 20):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = json_file.read(chunk_size)
+        eof = chunk == ''
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            read_more()
+
+    def expect(char: str):
+        nonlocal pos
+        if next_char() != char:
+            raise ValueError(f'Ошибка формата json: ожидается "{char}"')
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # значение, закончившееся на границе буфера, может быть неполным
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more()
+
+    expect('{')
+    if next_char() == '}':
+        return
+    while True:
+        next_char()
+        key = decode()
+        expect(':')
+        next_char()
+        yield key, decode()
+        if next_char() == ',':
+            pos += 1
+            continue
+        expect('}')
+        return
+
+
+# пути к файлам кэша разобранной истории: записи версий и индекс
+def get_history_cache_paths(history_path: str) -> tuple:
+    return f'{history_path}.cache', f'{history_path}.cache.idx'
+
+
+# признак соответствия кэша файлу истории: размер и хеш содержимого.
+# Файл истории формируется заново при каждом запуске, поэтому время изменения не подходит.
+# Хеш вычисляется потоково и намного быстрее разбора json
+def get_history_source_stamp(history_path: str, chunk_size: int = 1 << 20) -> list:
+    digest = hashlib.sha256()
+    size = 0
+    with open(history_path, 'rb') as history_file:
+        for chunk in iter(lambda: history_file.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return [size, digest.hexdigest()]
+
+
+# разбирает файл истории потоково и сохраняет компактный кэш:
+# записи версий по одной в строке, где автор и имена объектов заменены
+# номерами в таблице строк, и индекс (версия, смещение, длина) упорядоченный по версиям.
+# В памяти хранятся только таблица уникальных строк и индекс
+def build_history_cache(history_path: str):
+    logger = logging.getLogger(curr_logger_id())
+    logger.info('Начало построения кэша истории хранилища; %s', history_path)
+    records_path, index_path = get_history_cache_paths(history_path)
+    tmp_records_path = f'{records_path}.{os.getpid()}.tmp'
+    strings = dict()
+
+    def string_id(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    index = list()
+    offset = 0
+    stamp = get_history_source_stamp(history_path)
+    with open(history_path, 'r', encoding="utf_8_sig") as history_file, \
+            open(tmp_records_path, 'wb') as records_file:
+        for key, version_data in iter_json_object_items(history_file):
+            record = dict(version_data)
+            record['Author'] = string_id(version_data['Author'])
+            record['ChangedObjects'] = [string_id(val) for val in version_data['ChangedObjects']]
+            record['AddedObjects'] = [string_id(val) for val in version_data['AddedObjects']]
+            line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            records_file.write(line)
+            index.append([int(key), offset, len(line)])
+            offset += len(line)
+
+    index.sort()
+    os.replace(tmp_records_path, records_path)
+    write_json_file(index_path, {'source': stamp, 'strings': list(strings.keys()), 'index': index})
+    logger.info('Завершено построение кэша истории хранилища; версий: %s; строк: %s', len(index), len(strings))
+
+
+# последовательно возвращает (номер версии, данные версии) в порядке возрастания версий.
+# История читается из кэша, кэш строится заново, если файл истории изменился.
+# Автор и имена объектов повторяются в истории многократно, поэтому
+# в данных версий используются общие (интернированные) экземпляры строк
+def iter_history_file(history_path: str):
+    logger = logging.getLogger(curr_logger_id())
+    records_path, index_path = get_history_cache_paths(history_path)
+    try:
+        cache_index = read_json_file(index_path)
+        if cache_index['source'] != get_history_source_stamp(history_path) or not os.path.exists(records_path):
+            cache_index = None
+    except (OSError, ValueError, KeyError):
+        cache_index = None
+
+    if cache_index is None:
+        try:
+            build_history_cache(history_path)
+        except Exception:
+            logger.exception('Ошибка чтения файла истории хранилища; %s', history_path)
+            raise
+        cache_index = read_json_file(index_path)
+
+    strings = [sys.intern(value) for value in cache_index['strings']]
+    with open(records_path, 'rb') as records_file:
+        for ver, offset, length in cache_index['index']:
+            records_file.seek(offset)
+            version_data = json.loads(records_file.read(length).decode('utf-8'))
+            version_data['Author'] = strings[version_data['Author']]
+            version_data['ChangedObjects'] = [strings[val] for val in version_data['ChangedObjects']]
+            version_data['AddedObjects'] = [strings[val] for val in version_data['AddedObjects']]
+            yield ver, version_data
+
+
+# потоковое чтение истории хранилища источника
+def iter_storage_history(conf: dict):
+    return iter_history_file(conf['storage']['json_report_path'])
+
+
+# дата и время помещения версии в хранилище
+def get_version_stamp(version_data: dict) -> datetime:
+    return datetime.strptime(version_data['CommitDate'] + ' ' + version_data['CommitTime'], "%d.%m.%Y %H:%M:%S")
+
+
+# настройки режима догоняющей выгрузки, пустой словарь если режим не используется
+def get_catch_up_options(conf: dict) -> dict:
+    options = conf.get('catch_up', dict())
+    if not options.get('enabled', False):
+        return dict()
+
+    return options
+
+
+# проверяет, может ли версия войти в группу версий, выгружаемых одним коммитом.
+# Версии с разными номерами версии конфигурации (поле Version истории) всегда выгружаются
+# разными коммитами, чтобы каждый выпуск конфигурации оставался отдельной точкой истории.
+# Правила: версии одного автора с интервалом не более same_author_minutes;
+# до даты keep_every_before выгружается каждая keep_every версия,
+# в этот период размер группы не превышает keep_every при любом правиле
+def can_squash_version(options: dict, group: list, version_data: dict) -> bool:
+    last_data = group[-1][1]
+    if last_data['Version'] != version_data['Version']:
+        return False
+
+    stamp = get_version_stamp(version_data)
+    keep_every = options.get('keep_every', 0)
+    before = options.get('keep_every_before', '')
+    keep_every_used = keep_every > 1 and before != '' and stamp < datetime.strptime(before, "%d.%m.%Y")
+    if keep_every_used and len(group) >= keep_every:
+        return False
+
+    minutes = options.get('same_author_minutes', 0)
+    if minutes > 0 and last_data['Author'] == version_data['Author'] \
+            and (stamp - get_version_stamp(last_data)).total_seconds() <= minutes * 60:
+        return True
+
+    return keep_every_used
+
+
+# авторы версии истории; у объединенных версий их может быть несколько
+def get_version_authors(version_data: dict) -> list:
+    return version_data.get('Authors', [version_data['Author']])
+
+
+# объединяет данные группы версий: дата и версия конфигурации берутся
+# из последней версии группы, описание содержит описания всех версий,
+# списки объектов и авторов объединяются
+def get_squashed_version_data(group: list) -> dict:
+    if len(group) == 1:
+        return group[0][1]
+
+    squashed_data = dict(group[-1][1])
+    comments = list()
+    changed = dict()
+    added = dict()
+    authors = dict()
+    for ver, version_data in group:
+        comments.append(f'ver:{ver}; {version_data["Version"]}; {version_data["Author"]}; '
+                        f'{version_data["CommitDate"]} {version_data["CommitTime"]}; {version_data["CommitMessage"]}')
+        changed.update(dict.fromkeys(version_data['ChangedObjects']))
+        added.update(dict.fromkeys(version_data['AddedObjects']))
+        authors.update(dict.fromkeys(get_version_authors(version_data)))
+
+    squashed_data['CommitMessage'] = '\n'.join(comments)
+    squashed_data['ChangedObjects'] = list(changed)
+    squashed_data['AddedObjects'] = list(added)
+    squashed_data['SquashedVersions'] = [ver for ver, _ in group]
+    squashed_data['Authors'] = list(authors)
+    return squashed_data
+
+
+# догоняющая выгрузка: группирует подряд идущие версии по правилам catch_up
+# и возвращает для каждой группы только последнюю версию с объединенными данными
+def squash_history(options: dict, history):
+    group = list()
+    for ver, version_data in history:
+        if group and not can_squash_version(options, group, version_data):
+            yield group[-1][0], get_squashed_version_data(group)
+            group = list()
+        group.append((ver, version_data))
+
+    if group:
+        yield group[-1][0], get_squashed_version_data(group)
+
+
+# применяет к истории правила догоняющей выгрузки, если режим включен
+def iter_catch_up_history(conf: dict, history):
+    catch_up_options = get_catch_up_options(conf)
+    if catch_up_options:
+        return squash_history(catch_up_options, history)
+
+    return history
+
+
+# возвращает упорядоченные по номеру версии события истории одного источника
+def iter_source_events(source: dict, order: int):
+    for ver, version_data in iter_catch_up_history(source, iter_storage_history(source)):
+        yield get_version_stamp(version_data), order, ver, version_data
+
+
+# объединяет истории основной конфигурации и расширений в общую хронологию.
+# Точка истории - список (настройки источника, номер версии, данные версии)
+# с версиями разных источников, помещенными в хранилища в одно время.
+# Порядок версий внутри каждого источника сохраняется.
+def get_history_points(sources: list):
+    sources_events = [iter_source_events(source, order) for order, source in enumerate(sources)]
+    point = list()
+    point_stamp = None
+    point_orders = set()
+    for stamp, order, ver, version_data in heapq.merge(*sources_events, key=lambda event: (event[0], event[1])):
+        if point and (stamp != point_stamp or order in point_orders):
+            yield point
+            point = list()
+            point_orders = set()
+
+        point.append((sources[order], ver, version_data))
+        point_stamp = stamp
+        point_orders.add(order)
+
+    if point:
+        yield point
+
+
+# формирует данные версии для коммита точки истории.
+# Для расширений к комментарию и объектам добавляется имя расширения,
+# если в точку попало несколько источников, их данные объединяются,
+# дата коммита берется из последней версии точки
+def get_point_version_data(point: list) -> dict:
+    point_data = dict(point[-1][2])
+    # номер версии для описания коммита: если основная конфигурация не попала в точку,
+    # номер указывается с именем расширения
+    first_source, first_ver, first_data = point[0]
+    first_name = get_source_name(first_source)
+    squashed = first_data.get('SquashedVersions', list())
+    if squashed:
+        first_ver = f'{squashed[0]}-{squashed[-1]}'
+    point_data['PointVersion'] = str(first_ver) if first_name == '' else f'{first_name}:{first_ver}'
+    point_data['Version'] = ''
+    point_data['CommitMessage'] = ''
+    point_data['ChangedObjects'] = list()
+    point_data['AddedObjects'] = list()
+    for num, (source, ver, version_data) in enumerate(point):
+        name = get_source_name(source)
+        prefix = '' if name == '' else f'{name}: '
+        if num == 0:
+            point_data['Version'] = version_data['Version']
+        else:
+            point_data['Version'] += f'; {prefix}ver:{ver}; {version_data["Version"]}'
+        point_data['CommitMessage'] += f'{prefix}{version_data["CommitMessage"]}\n'
+        point_data['ChangedObjects'] += [prefix + val for val in version_data['ChangedObjects']]
+        point_data['AddedObjects'] += [prefix + val for val in version_data['AddedObjects']]
+
+    point_data['CommitMessage'] = point_data['CommitMessage'].rstrip('\n')
+    authors = dict()
+    for _, _, version_data in point:
+        authors.update(dict.fromkeys(get_version_authors(version_data)))
+    point_data['Authors'] = list(authors)
+    return point_data
+
 # завершение блока подготовки данных
 
 
@@ -409,6 +1442,9 @@ def read_storage_history(conf: dict) -> dict:
 
 # команда обновления конфигурации до заданной версии хранилища
 def update_to_storage_version_command(conf: dict, version_for_load: int) -> OCcommand:
+    if get_backend(conf) == 'ibcmd':
+        return ibcmd_update_to_storage_version_command(conf, version_for_load)
+
     onec = conf['onec']
     storage = conf['storage']
 
@@ -421,11 +1457,12 @@ def update_to_storage_version_command(conf: dict, version_for_load: int) -> OCco
 
     update_param_str = '/ConfigurationRepositoryF "{storage_path}" ' \
                        '/ConfigurationRepositoryN {storage_user} {storage_passwd_flag} ' \
-                       '/ConfigurationRepositoryUpdateCfg -force -v {ver_num} ' \
+                       '/ConfigurationRepositoryUpdateCfg -force -v {ver_num} {extension} ' \
                        ' '.format(storage_path=storage['path'],
                                   storage_user=storage['user'],
                                   storage_passwd_flag=passwd_flag,
-                                  ver_num=version_for_load)
+                                  ver_num=version_for_load,
+                                  extension=get_extension_param(conf))
 
     oc_command = OCcommand()
     oc_command.command_line = command_line + ' ' + update_param_str
@@ -447,11 +1484,15 @@ def update_to_storage_version(conf: dict, version_for_load: int):
 
 # команда выгрузки кофигурации в файлы
 def dump_configuration_to_git_command(conf: dict, first_dump: bool, ver: int) -> OCcommand:
+    if get_backend(conf) == 'ibcmd':
+        return ibcmd_dump_configuration_to_git_command(conf, first_dump, ver)
+
     onec = conf['onec']
     git_options = conf['git']
     command_line = get_onec_command_line(conf, 'DESIGNER')
 
-    dump_param_str = '/DumpConfigToFiles "{}"'.format(git_options['configuration_src_path'])
+    dump_param_str = '/DumpConfigToFiles "{}" {}'.format(git_options['configuration_src_path'],
+                                                         get_extension_param(conf))
 
     oc_command = OCcommand()
     if first_dump:
@@ -460,24 +1501,75 @@ def dump_configuration_to_git_command(conf: dict, first_dump: bool, ver: int) ->
         oc_command.command_line = command_line + ' ' + dump_param_str + ' -update'
     oc_command.desc = f'Выгрузка в git {ver}'
     oc_command.time_out = onec['dump_timeout']
+    oc_command.watch_path = git_options['configuration_src_path']
+    oc_command.watch_key = get_dump_stats_key(conf, first_dump)
     oc_command.successful_msg = ''
     oc_command.ignore_msg = True # игнорируем сообщение, т.к. при выгрузке в файлы могут выдаваться предупреждения
 
     return oc_command
 
 
-# выгружает основную конфигурацию в локальную папку git
+# выгружает в файлы конфигурацию одного источника истории
+def dump_source_to_git(conf: dict, first_dump: bool, ver: int, queue: multiprocessing.Queue = None):
+    if first_dump and is_parallel_dump_enabled(conf):
+        parallel_full_dump(conf, ver, queue)
+        return
+
+    oc_command = dump_configuration_to_git_command(conf, first_dump, ver)
+    execute_command(conf, oc_command)
+
+
+# удаляет результаты предыдущей выгрузки, кроме папки .git
+def clear_dump_dir(src_path: str):
+    for entry in os.listdir(src_path) if os.path.isdir(src_path) else list():
+        if entry == '.git':
+            continue
+        entry_path = os.path.join(src_path, entry)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path)
+        else:
+            os.remove(entry_path)
+
+
+# выгружает источник истории способом, выбранным для версии:
+# full - полностью, incremental - с ключом -update,
+# partial - только измененные объекты, full_verify - полностью в пустую папку с проверкой
+def dump_source_by_strategy(conf: dict, first_dump: bool, ver: int, version_data: dict,
+                            queue: multiprocessing.Queue = None):
+    # способ выгрузки выбирается под блокировкой: ConfigDumpInfo.xml предыдущей версии
+    # может изменяться при нормализации в процессе коммита
+    _, strategy = get_dump_strategy(conf, version_data, first_dump)
+    state = read_dump_state(conf)
+    if strategy == 'full' and is_dump_resumable(conf, state, ver):
+        resume_dump(conf, ver, state['started'])
+        write_dump_state(conf, ver, state['started'], True)
+        return
+
+    started = time.time_ns()
+    write_dump_state(conf, ver, started, False)
+    if strategy == 'partial':
+        partial_dump(conf, ver, version_data['ChangedObjects'])
+    elif strategy == 'full_verify':
+        clear_dump_dir(conf['git']['configuration_src_path'])
+        dump_source_to_git(conf, True, ver, queue)
+        verify_dump(conf, ver)
+    else:
+        dump_source_to_git(conf, strategy == 'full', ver, queue)
+    write_dump_state(conf, ver, started, True)
+
+
+# выгружает основную конфигурацию и расширения точки истории в локальную папку git
+# dump_tasks - список (настройки источника, первая выгрузка, номер версии источника, данные версии)
 # выполняется в дочернем процессе
-def dump_configuration_to_git(conf: dict, first_dump: bool, ver: int, lock: multiprocessing.Lock, queue: multiprocessing.Queue):
+def dump_configuration_to_git(dump_tasks: list, ver: int, lock: multiprocessing.Lock, queue: multiprocessing.Queue):
     logger = logging.getLogger(curr_logger_id())
     logger.info(f'Начало dump config to git; {ver}')
 
     lock.acquire()
     logger.info(f'Запуск выполнения dump config to git; {ver}')
     try:
-        subprocess_logger_config(conf, queue)
-        oc_command = dump_configuration_to_git_command(conf, first_dump, ver)
-        execute_command(conf, oc_command)
+        subprocess_logger_config(dump_tasks[0][0], queue)
+        run_on_receivers(dump_source_by_strategy, [(*task, queue) for task in dump_tasks], queue)
     except Exception as ex:
         logger.exception(f'Ошибка dump config to git; {ver}')
         raise ex
@@ -488,6 +1580,826 @@ def dump_configuration_to_git(conf: dict, first_dump: bool, ver: int, lock: mult
 # завершение блока выгрузки конфигурации
 
 
+# блок параллельной полной выгрузки
+# полная выгрузка большой конфигурации выполняется конфигуратором в один поток.
+# Список объектов из ConfigDumpInfo.xml делится на части, база-приемник копируется
+# для каждой части, и части выгружаются одновременно с ключом -listFile
+# в отдельные папки. Затем файлы частей переносятся в configuration_src_path
+# вместе с ConfigDumpInfo.xml, выгруженным для всей конфигурации
+
+def get_parallel_dump_options(conf: dict) -> dict:
+    return conf.get('parallel_dump', dict())
+
+
+# параллельная выгрузка выполняется только конфигуратором для файловой базы,
+# т.к. дополнительные базы-приемники получаются копированием ее папки.
+# ibcmd распараллеливает выгрузку сам (onec/ibcmd_threads).
+# В остальных случаях выполняется обычная полная выгрузка
+def is_parallel_dump_enabled(conf: dict) -> bool:
+    if get_parallel_dump_options(conf).get('receivers', 1) <= 1 or get_backend(conf) != 'designer':
+        return False
+
+    if not is_file_infobase(conf):
+        logger = logging.getLogger(curr_logger_id())
+        logger.warning('Параллельная выгрузка доступна только для файловой базы-приемника, '
+                       'выполняется обычная полная выгрузка')
+        return False
+
+    return True
+
+
+# команда выгрузки только файла ConfigDumpInfo.xml
+def dump_config_info_command(conf: dict, dump_path: str, ver: int) -> OCcommand:
+    oc_command = OCcommand()
+    oc_command.command_line = get_onec_command_line(conf, 'DESIGNER') + \
+        f' /DumpConfigToFiles "{dump_path}" {get_extension_param(conf)} -configDumpInfoOnly'
+    oc_command.desc = f'Выгрузка ConfigDumpInfo.xml {ver}'
+    oc_command.time_out = conf['onec']['dump_timeout']
+    oc_command.successful_msg = ''
+    oc_command.ignore_msg = True
+
+    return oc_command
+
+
+# команда выгрузки объектов из файла списка
+def dump_object_list_command(conf: dict, list_path: str, ver: int, part: int) -> OCcommand:
+    dump_path = conf['git']['configuration_src_path']
+    oc_command = OCcommand()
+    oc_command.command_line = get_onec_command_line(conf, 'DESIGNER') + \
+        f' /DumpConfigToFiles "{dump_path}" {get_extension_param(conf)} -listFile "{list_path}"'
+    oc_command.desc = f'Выгрузка части {part} в git {ver}'
+    oc_command.time_out = conf['onec']['dump_timeout']
+    oc_command.watch_path = dump_path
+    oc_command.watch_key = f'{get_source_name(conf)}:part{part}'
+    oc_command.successful_msg = ''
+    oc_command.ignore_msg = True
+
+    return oc_command
+
+
+# версии объектов метаданных из ConfigDumpInfo.xml, сгруппированные по объекту верхнего уровня:
+# {'Catalog.Товары': {'Catalog.Товары': '...', 'Catalog.Товары.Form.ФормаЭлемента': '...'}}
+def read_config_dump_versions(info_path: str) -> dict:
+    objects = dict()
+    for _, element in ElementTree.iterparse(info_path):
+        name = element.get('name')
+        if element.tag.rpartition('}')[2] == 'Metadata' and name:
+            top_name = '.'.join(name.split('.')[:2])
+            objects.setdefault(top_name, dict())[name] = element.get('configVersion', '')
+        element.clear()
+
+    return objects
+
+
+# объекты метаданных из ConfigDumpInfo.xml, сгруппированные по объекту верхнего уровня:
+# {'Catalog.Товары': ['Catalog.Товары', 'Catalog.Товары.Form.ФормаЭлемента', ...]}
+def read_config_dump_objects(info_path: str) -> dict:
+    return {top_name: list(names) for top_name, names in read_config_dump_versions(info_path).items()}
+
+
+# делит объекты на count частей близкого объема. Объем объекта оценивается
+# количеством его подчиненных объектов; при split = "kind" части состоят
+# из видов метаданных целиком (все справочники в одной части и т.д.)
+def split_dump_objects(objects: dict, count: int, split: str) -> list:
+    units = dict()
+    for top_name, names in objects.items():
+        unit_name = top_name.split('.')[0] if split == 'kind' else top_name
+        units.setdefault(unit_name, list()).extend(names)
+
+    parts = [list() for _ in range(count)]
+    heap = [(0, num) for num in range(count)]
+    for unit_name in sorted(units, key=lambda name: len(units[name]), reverse=True):
+        weight, num = heapq.heappop(heap)
+        parts[num].extend(units[unit_name])
+        heapq.heappush(heap, (weight + len(units[unit_name]), num))
+
+    return [part for part in parts if part]
+
+
+# настройки выгрузки частей. Первая часть выгружается основной базой-приемником,
+# остальные - копиями ее папки, которые находятся на той же версии хранилища
+def get_part_confs(conf: dict, count: int) -> list:
+    options = get_parallel_dump_options(conf)
+    part_confs = list()
+    for num in range(count):
+        part_conf = copy.deepcopy(conf)
+        part_conf['git']['configuration_src_path'] = os.path.join(options['path'], f'part_{num}')
+        if num > 0:
+            infobase_path = os.path.join(options['path'], f'ib_{num}')
+            clone_infobase(get_file_infobase_path(conf), infobase_path)
+            part_conf['info_base']['connection_string'] = f'File="{infobase_path}";'
+        part_confs.append(part_conf)
+
+    return part_confs
+
+
+# удаляет копии базы-приемника, папки выгрузки и списки объектов частей,
+# в т.ч. после ошибки выгрузки, чтобы копии баз не занимали место до следующей выгрузки
+def remove_part_files(conf: dict, count: int):
+    options = get_parallel_dump_options(conf)
+    for num in range(count):
+        shutil.rmtree(os.path.join(options['path'], f'part_{num}'), ignore_errors=True)
+        shutil.rmtree(os.path.join(options['path'], f'ib_{num}'), ignore_errors=True)
+        list_path = os.path.join(options['path'], f'part_{num}.txt')
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def dump_part(conf: dict, list_path: str, ver: int, part: int):
+    shutil.rmtree(conf['git']['configuration_src_path'], ignore_errors=True)
+    execute_command(conf, dump_object_list_command(conf, list_path, ver, part))
+
+
+# переносит файлы выгрузки части в папку выгрузки конфигурации.
+# Части не должны пересекаться, одинаковый файл с разным содержимым - ошибка
+def merge_dump_part(part_path: str, src_path: str):
+    for root, _, files in os.walk(part_path):
+        dst_root = os.path.join(src_path, os.path.relpath(root, part_path))
+        os.makedirs(dst_root, exist_ok=True)
+        for file_name in files:
+            if root == part_path and file_name == 'ConfigDumpInfo.xml':
+                continue
+            part_file = os.path.join(root, file_name)
+            dst_file = os.path.join(dst_root, file_name)
+            if os.path.exists(dst_file) and not filecmp.cmp(part_file, dst_file, shallow=False):
+                raise ValueError(f'Файл выгружен в нескольких частях с разным содержимым; {dst_file}')
+            shutil.move(part_file, dst_file)
+
+
+# полная выгрузка конфигурации частями на нескольких базах-приемниках
+def parallel_full_dump(conf: dict, ver: int, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_parallel_dump_options(conf)
+    src_path = conf['git']['configuration_src_path']
+    info_path = os.path.join(options['path'], 'info')
+    os.makedirs(options['path'], exist_ok=True)
+    shutil.rmtree(info_path, ignore_errors=True)
+    execute_command(conf, dump_config_info_command(conf, info_path, ver))
+
+    parts = split_dump_objects(read_config_dump_objects(os.path.join(info_path, 'ConfigDumpInfo.xml')),
+                               options['receivers'], options.get('split', 'size'))
+    logger.info(f'Параллельная выгрузка; версия: {ver}; объектов по частям: {[len(part) for part in parts]}')
+
+    try:
+        tasks = list()
+        for num, part_conf in enumerate(get_part_confs(conf, len(parts))):
+            list_path = os.path.join(options['path'], f'part_{num}.txt')
+            with open(list_path, mode='w', encoding='utf-8-sig') as list_file:
+                list_file.write('\n'.join(parts[num]) + '\n')
+            tasks.append((part_conf, list_path, ver, num))
+        run_on_receivers(dump_part, tasks, queue)
+
+        clear_dump_dir(src_path)
+        for part_conf, _, _, _ in tasks:
+            merge_dump_part(part_conf['git']['configuration_src_path'], src_path)
+    finally:
+        remove_part_files(conf, len(parts))
+    shutil.copyfile(os.path.join(info_path, 'ConfigDumpInfo.xml'), os.path.join(src_path, 'ConfigDumpInfo.xml'))
+    logger.info(f'Параллельная выгрузка завершена; версия: {ver}; частей: {len(parts)}')
+
+# завершение блока параллельной полной выгрузки
+
+
+# блок планирования выгрузки версий
+# перед обработкой история классифицируется по составу изменений версий,
+# и для каждой версии выбирается самый дешевый безопасный способ выгрузки:
+# empty - версия без изменений объектов (например, только метка): выгрузка пропускается;
+# small - изменено немного существующих объектов: выгружаются они и объекты, отличающиеся от базы-приемника;
+# root - изменены свойства конфигурации: инкрементная выгрузка;
+# regular - прочие версии: инкрементная выгрузка;
+# huge - массовые изменения: полная выгрузка в пустую папку с проверкой
+
+TRIAGE_STRATEGIES = {'empty': 'skip', 'small': 'partial', 'root': 'incremental', 'regular': 'incremental',
+                     'huge': 'full_verify'}
+
+# оценка длительности обработки версии в секундах по способу выгрузки
+TRIAGE_COST = {'skip': 1, 'partial': 60, 'incremental': 300, 'full': 1800, 'full_verify': 2400}
+
+# соответствие видов метаданных отчета по хранилищу и выгрузки в файлы
+METADATA_KINDS = {
+    'Справочник': 'Catalog', 'Документ': 'Document', 'Перечисление': 'Enum', 'Отчет': 'Report',
+    'Обработка': 'DataProcessor', 'РегистрСведений': 'InformationRegister',
+    'РегистрНакопления': 'AccumulationRegister', 'РегистрБухгалтерии': 'AccountingRegister',
+    'РегистрРасчета': 'CalculationRegister', 'ПланВидовХарактеристик': 'ChartOfCharacteristicTypes',
+    'ПланСчетов': 'ChartOfAccounts', 'ПланВидовРасчета': 'ChartOfCalculationTypes',
+    'БизнесПроцесс': 'BusinessProcess', 'Задача': 'Task', 'ПланОбмена': 'ExchangePlan', 'Константа': 'Constant',
+    'ЖурналДокументов': 'DocumentJournal', 'Нумератор': 'DocumentNumerator', 'Последовательность': 'Sequence',
+    'КритерийОтбора': 'FilterCriterion', 'ОбщийМодуль': 'CommonModule', 'ОбщаяФорма': 'CommonForm',
+    'ОбщийМакет': 'CommonTemplate', 'ОбщаяКартинка': 'CommonPicture', 'ОбщаяКоманда': 'CommonCommand',
+    'ГруппаКоманд': 'CommandGroup', 'ОбщийРеквизит': 'CommonAttribute', 'Подсистема': 'Subsystem',
+    'Роль': 'Role', 'ПараметрСеанса': 'SessionParameter', 'ФункциональнаяОпция': 'FunctionalOption',
+    'ПараметрФункциональныхОпций': 'FunctionalOptionsParameter', 'ХранилищеНастроек': 'SettingsStorage',
+    'ПодпискаНаСобытие': 'EventSubscription', 'РегламентноеЗадание': 'ScheduledJob',
+    'HTTPСервис': 'HTTPService', 'WebСервис': 'WebService', 'WSСсылка': 'WSReference',
+    'XDTOПакет': 'XDTOPackage', 'ОпределяемыйТип': 'DefinedType', 'Стиль': 'Style', 'ЭлементСтиля': 'StyleItem',
+    'Язык': 'Language', 'Интерфейс': 'Interface', 'ВнешнийИсточникДанных': 'ExternalDataSource'}
+
+# папки выгрузки видов метаданных, имя которых не образуется добавлением "s"
+METADATA_KIND_DIRS = {
+    'ChartOfCharacteristicTypes': 'ChartsOfCharacteristicTypes', 'ChartOfAccounts': 'ChartsOfAccounts',
+    'ChartOfCalculationTypes': 'ChartsOfCalculationTypes', 'BusinessProcess': 'BusinessProcesses',
+    'FilterCriterion': 'FilterCriteria'}
+
+# папки выгрузки подчиненных объектов, у которых есть собственный файл описания
+METADATA_SUBORDINATE_DIRS = {'Form': 'Forms', 'Template': 'Templates'}
+
+
+# настройки планирования, пустой словарь если режим не используется
+def get_triage_options(conf: dict) -> dict:
+    options = conf.get('triage', dict())
+    if not options.get('enabled', False):
+        return dict()
+
+    return options
+
+
+# имя объекта верхнего уровня в выгрузке: "Справочник.Товары.Форма.Ф" -> "Catalog.Товары".
+# пустая строка, если вид метаданных неизвестен
+def get_dump_object_name(report_name: str) -> str:
+    kind, _, rest = report_name.partition('.')
+    kind = METADATA_KINDS.get(kind, kind)
+    if kind not in METADATA_KINDS.values():
+        return ''
+
+    return f'{kind}.{rest.split(".")[0]}'
+
+
+# объекты текущей выгрузки источника, пустой словарь если выгрузки нет
+def read_source_dump_objects(conf: dict) -> dict:
+    info_path = os.path.join(conf['git']['configuration_src_path'], 'ConfigDumpInfo.xml')
+    if not os.path.exists(info_path):
+        return dict()
+
+    return read_config_dump_objects(info_path)
+
+
+# версия может быть выгружена частично: изменено немного существующих объектов,
+# корень конфигурации не изменен. Окончательно это определяется по составу текущей выгрузки
+def is_small_version(options: dict, version_data: dict) -> bool:
+    changed = version_data['ChangedObjects']
+    return not version_data['AddedObjects'] and 0 < len(changed) <= options.get('small_objects', 20) \
+        and all('.' in name for name in changed)
+
+
+# класс версии по составу изменений. dump_objects - объекты текущей выгрузки,
+# используются только для версий, которые могут быть выгружены частично
+def classify_version(options: dict, version_data: dict, dump_objects: dict) -> str:
+    changed = version_data['ChangedObjects']
+    added = version_data['AddedObjects']
+    count = len(changed) + len(added)
+    if count == 0:
+        return 'empty'
+    # корневой объект конфигурации в отчете указывается без вида метаданных
+    if any('.' not in name for name in changed + added):
+        return 'root'
+    if count >= options.get('huge_objects', 1000):
+        return 'huge'
+    if is_small_version(options, version_data) \
+            and all(get_dump_object_name(name) in dump_objects for name in changed):
+        return 'small'
+
+    return 'regular'
+
+
+# класс версии источника и способ ее выгрузки. Без планирования
+# выгрузка полная при первой выгрузке после запуска и инкрементная в остальных случаях.
+# Первая выгрузка после восстановления базы-приемника не может быть частичной или инкрементной.
+# ConfigDumpInfo.xml читается, только если версия может быть выгружена частично,
+# поэтому вызывать функцию без dump_objects можно только под блокировкой папки выгрузки
+def get_dump_strategy(conf: dict, version_data: dict, first_dump: bool, dump_objects: dict = None) -> tuple:
+    options = get_triage_options(conf)
+    if not options:
+        return '', 'full' if first_dump else 'incremental'
+
+    if dump_objects is None:
+        dump_objects = dict()
+        if is_small_version(options, version_data):
+            dump_objects = read_source_dump_objects(conf)
+    version_class = classify_version(options, version_data, dump_objects)
+    strategy = TRIAGE_STRATEGIES[version_class]
+    if first_dump and strategy in ('partial', 'incremental'):
+        strategy = 'full'
+
+    return version_class, strategy
+
+
+# пропуск выгрузки версии определяется без чтения текущей выгрузки,
+# т.к. класс empty от ее состава не зависит
+def is_dump_skipped(conf: dict, version_data: dict) -> bool:
+    return get_dump_strategy(conf, version_data, False, dict())[1] == 'skip'
+
+
+# план обработки истории: для каждой версии источника класс, способ выгрузки и оценка длительности
+def plan_history(sources: list, points) -> list:
+    first_dump = {get_source_name(source): True for source in sources}
+    dump_objects = dict()
+    plan = list()
+    for point in points:
+        for source, source_ver, version_data in point:
+            name = get_source_name(source)
+            if name not in dump_objects and is_small_version(get_triage_options(source), version_data):
+                dump_objects[name] = read_source_dump_objects(source)
+            version_class, strategy = get_dump_strategy(source, version_data, first_dump[name],
+                                                         dump_objects.get(name, dict()))
+            cost = get_triage_options(source).get('cost', dict()).get(strategy, TRIAGE_COST[strategy])
+            plan.append({'source': name, 'version': source_ver, 'class': version_class, 'strategy': strategy,
+                         'objects': len(version_data['ChangedObjects']) + len(version_data['AddedObjects']),
+                         'cost': cost})
+            if strategy != 'skip':
+                first_dump[name] = False
+
+    return plan
+
+
+# выводит план обработки истории без выполнения выгрузки
+def print_triage_plan(sources: list):
+    plan = plan_history(sources, get_history_points(sources))
+    print('источник; версия; класс; способ выгрузки; объектов; оценка, сек')
+    for item in plan:
+        source = item['source'] if item['source'] != '' else 'основная конфигурация'
+        print(f'{source}; {item["version"]}; {item["class"]}; {item["strategy"]}; {item["objects"]}; {item["cost"]}')
+
+    totals = dict()
+    for item in plan:
+        count, cost = totals.get(item['strategy'], (0, 0))
+        totals[item['strategy']] = (count + 1, cost + item['cost'])
+    print()
+    for strategy, (count, cost) in totals.items():
+        print(f'{strategy}: версий {count}, оценка {cost / 3600:.1f} ч')
+    print(f'всего: версий {len(plan)}, оценка {sum(item["cost"] for item in plan) / 3600:.1f} ч')
+
+
+# папка выгрузки объекта верхнего уровня, для корня конфигурации - путь к Configuration.xml без расширения
+def get_dump_object_path(src_path: str, object_name: str) -> str:
+    kind, _, name = object_name.partition('.')
+    if kind == 'Configuration':
+        return os.path.join(src_path, 'Configuration')
+    return os.path.join(src_path, METADATA_KIND_DIRS.get(kind, f'{kind}s'), name)
+
+
+# частичная выгрузка: сначала для базы-приемника выгружается ConfigDumpInfo.xml
+# и сравнивается с ConfigDumpInfo.xml папки выгрузки. Заново с ключом -listFile
+# выгружаются объекты версии и все объекты с отличающимися версиями или без файла описания,
+# файлы удаленных объектов удаляются
+def partial_dump(conf: dict, ver: int, changed_objects: list):
+    logger = logging.getLogger(curr_logger_id())
+    src_path = conf['git']['configuration_src_path']
+    work_dir = create_command_work_dir(conf)
+    info_path = os.path.join(work_dir, 'info')
+    execute_command(conf, dump_config_info_command(conf, info_path, ver))
+    receiver_versions = read_config_dump_versions(os.path.join(info_path, 'ConfigDumpInfo.xml'))
+    dump_versions = read_config_dump_versions(os.path.join(src_path, 'ConfigDumpInfo.xml'))
+
+    object_names = set(get_dump_object_name(name) for name in changed_objects)
+    stale = get_stale_objects(src_path, receiver_versions, dump_versions)
+    stale.update(name for name in object_names if name in receiver_versions)
+    deleted = [name for name in dump_versions if name not in receiver_versions]
+    logger.info(f'Частичная выгрузка; версия: {ver}; объекты версии: {sorted(object_names)}; '
+                f'выгружаются заново: {len(stale)}; удалены: {len(deleted)}')
+
+    for object_name in deleted:
+        remove_dump_object(src_path, object_name)
+    redump_objects(conf, ver, os.path.join(work_dir, 'objects.txt'),
+                   {name: receiver_versions[name] for name in sorted(stale)},
+                   f'Частичная выгрузка в git {ver}', f'{get_source_name(conf)}:partial')
+
+    shutil.copyfile(os.path.join(info_path, 'ConfigDumpInfo.xml'), os.path.join(src_path, 'ConfigDumpInfo.xml'))
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# удаляет файлы объекта верхнего уровня из выгрузки
+def remove_dump_object(src_path: str, object_name: str):
+    object_path = get_dump_object_path(src_path, object_name)
+    shutil.rmtree(object_path, ignore_errors=True)
+    if os.path.exists(f'{object_path}.xml'):
+        os.remove(f'{object_path}.xml')
+
+
+# файлы, которые должны быть в папке выгрузки для объекта верхнего уровня:
+# файл описания объекта, а для форм и макетов - их файлы описания в папке объекта
+def get_dump_object_files(src_path: str, object_name: str, names) -> list:
+    object_path = get_dump_object_path(src_path, object_name)
+    files = [f'{object_path}.xml']
+    for name in names:
+        parts = name.split('.')
+        if len(parts) == 4 and parts[2] in METADATA_SUBORDINATE_DIRS:
+            files.append(os.path.join(object_path, METADATA_SUBORDINATE_DIRS[parts[2]], f'{parts[3]}.xml'))
+
+    return files
+
+
+# объекты из ConfigDumpInfo.xml, файлов которых нет в папке выгрузки
+def get_missing_objects(src_path: str, object_versions: dict) -> list:
+    return [object_name for object_name, versions in object_versions.items()
+            if not all(os.path.exists(path) for path in get_dump_object_files(src_path, object_name, versions))]
+
+
+# проверяет полную выгрузку по ConfigDumpInfo.xml: для каждого объекта в папке выгрузки
+# должны быть файл описания и папка с файлами форм и макетов. Отсутствующие объекты
+# выгружаются заново с ключом -listFile, если их файлов нет и после этого - ошибка
+def verify_dump(conf: dict, ver: int):
+    logger = logging.getLogger(curr_logger_id())
+    src_path = conf['git']['configuration_src_path']
+    info_path = os.path.join(src_path, 'ConfigDumpInfo.xml')
+    if not os.path.exists(info_path):
+        raise ValueError(f'В выгрузке версии {ver} нет ConfigDumpInfo.xml')
+
+    dump_versions = read_config_dump_versions(info_path)
+    missing = get_missing_objects(src_path, dump_versions)
+    if missing:
+        logger.warning(f'В выгрузке версии {ver} нет файлов объектов, выгружаются заново; {missing[:20]}')
+        write_metric(conf, 'dump_verify', {'version': ver, 'objects': len(dump_versions), 'missing': len(missing)})
+        work_dir = create_command_work_dir(conf)
+        redump_objects(conf, ver, os.path.join(work_dir, 'objects.txt'),
+                       {name: dump_versions[name] for name in missing},
+                       f'Повторная выгрузка объектов в git {ver}', f'{get_source_name(conf)}:verify')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        missing = get_missing_objects(src_path, dump_versions)
+    if missing:
+        raise ValueError(f'В выгрузке версии {ver} нет файлов объектов; {missing[:20]}')
+    logger.info(f'Выгрузка версии {ver} проверена; объектов: {len(dump_versions)}')
+
+# завершение блока планирования выгрузки версий
+
+
+# блок продолжения прерванной выгрузки
+# перед выгрузкой источника записывается признак начала выгрузки версии,
+# после успешной выгрузки - признак завершения. Если процесс прервался
+# во время выгрузки, при следующем запуске база-приемник загружается до той же версии,
+# и вместо полной выгрузки по ConfigDumpInfo.xml базы-приемника и папки выгрузки
+# определяются отсутствующие, устаревшие и записанные прерванной выгрузкой объекты.
+# Выгружаются заново только они
+
+def get_dump_state_path(conf: dict) -> str:
+    return conf['onec'].get('dump_state_path', conf['storage']['version_path'] + '.dump')
+
+
+def read_dump_state(conf: dict) -> dict:
+    try:
+        return read_json_file(get_dump_state_path(conf))
+    except (OSError, ValueError):
+        return dict()
+
+
+def write_dump_state(conf: dict, ver: int, started: int, done: bool):
+    write_json_file(get_dump_state_path(conf), {'version': ver, 'receiver': get_receiver_key(conf),
+                                                'started': started, 'done': done})
+
+
+# выгрузку можно продолжить, если прервалась выгрузка той же версии в ту же базу-приемник,
+# а в папке выгрузки есть ConfigDumpInfo.xml предыдущей завершенной выгрузки
+def is_dump_resumable(conf: dict, state: dict, ver: int) -> bool:
+    if not state or state['done'] or state['version'] != ver or state['receiver'] != get_receiver_key(conf):
+        return False
+
+    return os.path.exists(os.path.join(conf['git']['configuration_src_path'], 'ConfigDumpInfo.xml'))
+
+
+# объекты верхнего уровня, файлы которых изменены после начала прерванной выгрузки
+def get_modified_objects(src_path: str, started: int, object_paths: dict) -> set:
+    modified = set()
+    for root, _, files in os.walk(src_path):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            if os.stat(file_path).st_mtime_ns < started - POLL_TIME_SLACK_NS:
+                continue
+            parts = os.path.relpath(file_path, src_path).split(os.sep)
+            if parts[0] == 'ConfigDumpInfo.xml':
+                continue
+            if len(parts) == 1 or parts[0] == 'Ext':
+                object_path = os.path.join(src_path, 'Configuration')
+            else:
+                object_path = os.path.join(src_path, parts[0], parts[1].removesuffix('.xml'))
+            if object_path in object_paths:
+                modified.add(object_paths[object_path])
+
+    return modified
+
+
+# объекты базы-приемника, версии которых в ConfigDumpInfo.xml папки выгрузки отличаются
+# или файла описания которых нет в папке выгрузки
+def get_stale_objects(src_path: str, receiver_versions: dict, dump_versions: dict) -> set:
+    stale = set()
+    for object_name, versions in receiver_versions.items():
+        object_path = get_dump_object_path(src_path, object_name)
+        if versions != dump_versions.get(object_name) or not os.path.exists(f'{object_path}.xml'):
+            stale.add(object_name)
+
+    return stale
+
+
+# удаляет файлы объектов и выгружает их заново с ключом -listFile.
+# objects - объекты верхнего уровня со списками подчиненных объектов
+def redump_objects(conf: dict, ver: int, list_path: str, objects: dict, desc: str, watch_key: str):
+    if not objects:
+        return
+
+    src_path = conf['git']['configuration_src_path']
+    with open(list_path, mode='w', encoding='utf-8-sig') as list_file:
+        for object_name, names in objects.items():
+            list_file.write('\n'.join(names) + '\n')
+            remove_dump_object(src_path, object_name)
+    oc_command = dump_object_list_command(conf, list_path, ver, 0)
+    oc_command.desc = desc
+    oc_command.watch_key = watch_key
+    execute_command(conf, oc_command)
+
+
+# продолжает прерванную выгрузку версии
+def resume_dump(conf: dict, ver: int, started: int):
+    logger = logging.getLogger(curr_logger_id())
+    src_path = conf['git']['configuration_src_path']
+    work_dir = create_command_work_dir(conf)
+    info_path = os.path.join(work_dir, 'info')
+    execute_command(conf, dump_config_info_command(conf, info_path, ver))
+    receiver_versions = read_config_dump_versions(os.path.join(info_path, 'ConfigDumpInfo.xml'))
+    dump_versions = read_config_dump_versions(os.path.join(src_path, 'ConfigDumpInfo.xml'))
+
+    object_paths = {get_dump_object_path(src_path, name): name for name in receiver_versions}
+    stale = get_modified_objects(src_path, started, object_paths)
+    stale.update(get_stale_objects(src_path, receiver_versions, dump_versions))
+    deleted = [name for name in dump_versions if name not in receiver_versions]
+    logger.info(f'Продолжение выгрузки; версия: {ver}; объектов: {len(receiver_versions)}; '
+                f'выгружаются заново: {len(stale)}; удалены: {len(deleted)}')
+    write_metric(conf, 'dump_resume', {'version': ver, 'objects': len(receiver_versions),
+                                       'stale': len(stale), 'deleted': len(deleted)})
+
+    for object_name in deleted:
+        remove_dump_object(src_path, object_name)
+    redump_objects(conf, ver, os.path.join(work_dir, 'objects.txt'),
+                   {name: receiver_versions[name] for name in sorted(stale)},
+                   f'Продолжение выгрузки в git {ver}', f'{get_source_name(conf)}:resume')
+
+    shutil.copyfile(os.path.join(info_path, 'ConfigDumpInfo.xml'), os.path.join(src_path, 'ConfigDumpInfo.xml'))
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+# завершение блока продолжения прерванной выгрузки
+
+
+# блок нормализации выгрузки
+# при каждой выгрузке 1С может менять несущественные детали файлов:
+# BOM, переводы строк, порядок атрибутов. Нормализация между выгрузкой
+# и git add приводит измененные файлы к единому виду, чтобы в коммит
+# не попадали файлы без фактических изменений.
+# функции правил выполняются в пуле процессов
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# открывающий тег xml с атрибутами, значения атрибутов могут содержать '>'
+XML_START_TAG = re.compile(r'<([A-Za-z_][\w.:-]*)((?:\s+[\w.:-]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))+)(\s*/?)>')
+XML_ATTRIBUTE = re.compile(r'([\w.:-]+)\s*=\s*("[^"]*"|\'[^\']*\')')
+
+
+def normalize_remove_bom(data: bytes) -> bytes:
+    return data[len(UTF8_BOM):] if data.startswith(UTF8_BOM) else data
+
+
+def normalize_add_bom(data: bytes) -> bytes:
+    return data if data.startswith(UTF8_BOM) else UTF8_BOM + data
+
+
+def normalize_lf(data: bytes) -> bytes:
+    return data.replace(b'\r\n', b'\n')
+
+
+def normalize_crlf(data: bytes) -> bytes:
+    return normalize_lf(data).replace(b'\n', b'\r\n')
+
+
+def normalize_strip_trailing_spaces(data: bytes) -> bytes:
+    return re.sub(rb'[ \t]+(?=\r?\n|$)', b'', data)
+
+
+# сортирует атрибуты открывающих тегов по имени,
+# объявления пространств имен остаются первыми в исходном порядке
+def normalize_sort_attributes(data: bytes) -> bytes:
+    def sort_tag(match) -> str:
+        attributes = XML_ATTRIBUTE.findall(match.group(2))
+        namespaces = [attr for attr in attributes if attr[0] == 'xmlns' or attr[0].startswith('xmlns:')]
+        others = sorted(attr for attr in attributes if attr not in namespaces)
+        attributes_str = ''.join(f' {name}={value}' for name, value in namespaces + others)
+        return f'<{match.group(1)}{attributes_str}{match.group(3)}>'
+
+    return XML_START_TAG.sub(sort_tag, data.decode('utf-8')).encode('utf-8')
+
+
+NORMALIZATION_RULES = {
+    'remove_bom': normalize_remove_bom,
+    'add_bom': normalize_add_bom,
+    'lf': normalize_lf,
+    'crlf': normalize_crlf,
+    'strip_trailing_spaces': normalize_strip_trailing_spaces,
+    'sort_attributes': normalize_sort_attributes,
+}
+
+
+# хэш объекта blob git для содержимого файла
+def get_git_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+# возвращает измененные и новые файлы рабочего каталога относительно HEAD:
+# список (статус, путь относительно корня репо)
+def get_changed_files(repo: git.Repo) -> list:
+    entries = repo.git.status('--porcelain', '-z', '--untracked-files=all').split('\0')
+    changed_files = list()
+    pos = 0
+    while pos < len(entries):
+        entry = entries[pos]
+        pos += 1
+        if entry == '':
+            continue
+        status = entry[:2]
+        changed_files.append((status, entry[3:]))
+        # для переименования следующий элемент - исходный путь
+        if 'R' in status or 'C' in status:
+            pos += 1
+
+    return changed_files
+
+
+# применяет правила к файлу и перезаписывает его, только если содержимое изменилось.
+# выполняется в пуле процессов.
+# Возвращает (путь, размер до, размер после, файл перезаписан, совпадает с HEAD)
+def normalize_file(task: tuple) -> tuple:
+    file_path, rules, head_sha = task
+    with open(file_path, 'rb') as src_file:
+        data = src_file.read()
+
+    normalized = data
+    for rule in rules:
+        normalized = NORMALIZATION_RULES[rule](normalized)
+
+    rewritten = normalized != data
+    if rewritten:
+        with open(file_path, 'wb') as src_file:
+            src_file.write(normalized)
+
+    return file_path, len(data), len(normalized), rewritten, get_git_blob_sha(normalized) == head_sha
+
+
+# правила нормализации для файла по его расширению
+def get_normalization_rules(options: dict, file_path: str) -> list:
+    file_name = os.path.basename(file_path)
+    for pattern in options.get('exclude', list()):
+        if fnmatch.fnmatch(file_name, pattern) or fnmatch.fnmatch(file_path, pattern):
+            return list()
+
+    return options['rules'].get(os.path.splitext(file_name)[1].lower(), list())
+
+
+# нормализует измененные после выгрузки файлы репо в пуле процессов
+# и сообщает, сколько файлов и байт удалось исключить из коммита.
+# выполняется перед git add
+def normalize_dump(conf: dict, repo: git.Repo, ver: int):
+    options = conf.get('normalization', dict())
+    if not options.get('enabled', False):
+        return
+
+    logger = logging.getLogger(curr_logger_id())
+    logger.info(f'Начало нормализации выгрузки; {ver}')
+    head_shas = dict()
+    if repo.head.is_valid():
+        for line in repo.git.ls_tree('-r', '-z', 'HEAD').split('\0'):
+            if line != '':
+                info, path = line.split('\t', 1)
+                head_shas[path] = info.split()[2]
+
+    tasks = list()
+    for status, path in get_changed_files(repo):
+        rules = get_normalization_rules(options, path)
+        if 'D' in status or not rules:
+            continue
+        tasks.append((os.path.join(repo.working_tree_dir, path), rules, head_shas.get(path, '')))
+
+    normalized_count = 0
+    unchanged_count = 0
+    bytes_reduced = 0
+    unchanged_bytes = 0
+    if tasks:
+        with multiprocessing.Pool(options.get('processes', os.cpu_count())) as pool:
+            for file_path, size_before, size_after, rewritten, same_as_head in pool.imap_unordered(normalize_file,
+                                                                                                   tasks, 64):
+                if rewritten:
+                    logger.debug(f'Нормализован файл; {ver}; {file_path}')
+                    normalized_count += 1
+                    bytes_reduced += size_before - size_after
+                if same_as_head:
+                    unchanged_count += 1
+                    unchanged_bytes += size_after
+
+    report = {'version': ver,
+              'files_checked': len(tasks),
+              'files_normalized': normalized_count,
+              'files_unchanged_after_normalization': unchanged_count,
+              'bytes_reduced': bytes_reduced,
+              'bytes_excluded_from_commit': unchanged_bytes}
+    write_metric(conf, 'normalization', report)
+    logger.info(f'Завершена нормализация выгрузки; {report}')
+
+# завершение блока нормализации выгрузки
+
+
+# блок манифеста изменений
+# для каждого push формируется список файлов и объектов метаданных,
+# измененных с предыдущего push, с группировкой по версиям хранилища и авторам.
+# Анализаторы кода (SonarQube и др.) по манифесту проверяют только изменения
+
+# настройки манифеста, пустой словарь если манифест не формируется
+def get_manifest_options(conf: dict) -> dict:
+    return conf['git'].get('manifest', dict())
+
+
+# коммит, помещенный предыдущим push: ссылка удаленной ветки обновляется при каждом push
+def get_pushed_commit(repo: git.Repo, branch: str) -> str:
+    try:
+        return repo.git.rev_parse('--verify', '-q', f'refs/remotes/origin/{branch}')
+    except git.GitCommandError:
+        return ''
+
+
+# разбор вывода --name-status -z: [(статус, путь)]
+def parse_name_status(out: str) -> list:
+    items = out.split('\0')
+    return [(items[num][0], items[num + 1]) for num in range(0, len(items) - 1, 2)]
+
+
+# объект метаданных верхнего уровня по пути файла выгрузки, пустая строка для прочих файлов
+def get_path_object_name(src_rel_path: str, file_path: str) -> str:
+    if src_rel_path not in ('', '.'):
+        if not file_path.startswith(src_rel_path + '/'):
+            return ''
+        file_path = file_path[len(src_rel_path) + 1:]
+
+    parts = file_path.split('/')
+    if parts[0] == 'ConfigDumpInfo.xml':
+        return ''
+    if len(parts) == 1 or parts[0] == 'Ext':
+        return 'Configuration'
+
+    kind_dirs = {kind_dir: kind for kind, kind_dir in METADATA_KIND_DIRS.items()}
+    kind = kind_dirs.get(parts[0], parts[0].removesuffix('s'))
+    return f'{kind}.{parts[1].removesuffix(".xml")}'
+
+
+def build_push_manifest(conf: dict, repo: git.Repo, branch: str) -> dict:
+    git_options = conf['git']
+    src_rel_path = os.path.relpath(git_options['configuration_src_path'], git_options['path']).replace(os.sep, '/')
+    base = get_pushed_commit(repo, branch)
+    head = repo.head.commit.hexsha
+
+    groups = dict()
+    for commit in repo.iter_commits(head if base == '' else f'{base}..{head}', reverse=True):
+        match = re.search(r'ver:(\S+?);', commit.message)
+        version = match.group(1) if match else ''
+        group = groups.setdefault((version, commit.author.email), {
+            'version': version, 'author': commit.author.name, 'email': commit.author.email,
+            'commits': list(), 'files': dict()})
+        group['commits'].append(commit.hexsha)
+        out = repo.git.diff_tree('--no-commit-id', '--name-status', '--no-renames', '-r', '-z', '--root',
+                                 commit.hexsha)
+        group['files'].update((path, status) for status, path in parse_name_status(out))
+
+    if base == '':
+        files = [('A', path) for path in repo.git.ls_tree('-r', '-z', '--name-only', head).split('\0') if path]
+    else:
+        files = parse_name_status(repo.git.diff('--name-status', '--no-renames', '-z', base, head))
+
+    versions = list()
+    for group in groups.values():
+        group['objects'] = sorted({get_path_object_name(src_rel_path, path) for path in group['files']} - {''})
+        group['files'] = [{'status': status, 'path': path} for path, status in group['files'].items()]
+        versions.append(group)
+
+    return {'branch': branch, 'base': base, 'head': head, 'created': datetime.now().isoformat(),
+            'files': [{'status': status, 'path': path} for status, path in files],
+            'objects': sorted({get_path_object_name(src_rel_path, path) for _, path in files} - {''}),
+            'versions': versions}
+
+
+# сохраняет манифест в файл в папке manifest/path и (или) в заметку git к последнему коммиту
+def save_push_manifest(conf: dict, repo: git.Repo, manifest: dict):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_manifest_options(conf)
+    if options.get('path', '') != '':
+        os.makedirs(options['path'], exist_ok=True)
+        file_name = '{}_{}.json'.format(datetime.now().strftime("%Y_%m_%d_%H_%M_%S"), manifest['head'][:12])
+        write_json_file(os.path.join(options['path'], file_name), manifest)
+        write_json_file(os.path.join(options['path'], 'latest.json'), manifest)
+    notes_ref = options.get('notes_ref', '')
+    if notes_ref != '':
+        repo.git.notes('--ref', notes_ref, 'add', '-f', '-m', json.dumps(manifest, ensure_ascii=False, indent=1),
+                       manifest['head'])
+        repo.remotes['origin'].push(refspec=f'refs/notes/{notes_ref}:refs/notes/{notes_ref}')
+
+    logger.info(f'Манифест изменений; коммит: {manifest["head"]}; версий: {len(manifest["versions"])}; '
+                f'файлов: {len(manifest["files"])}; объектов: {len(manifest["objects"])}')
+    write_metric(conf, 'push_manifest', {'head': manifest['head'], 'versions': len(manifest['versions']),
+                                         'files': len(manifest['files']), 'objects': len(manifest['objects'])})
+
+# завершение блока манифеста изменений
+
+
 # блок обработки команд git
 # функции данного блока выполняются в дочерних процессах
 
@@ -499,12 +2411,16 @@ def git_push(conf: dict, ver:  int):
 
     git_options = conf['git']
     repo = git.Repo(git_options['path'], search_parent_directories=False)
-    # добавляем номер версии преред push
-    # теоретически должно помочь при определении
-    # новой порции кода в сонаре
-    tag = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    out = repo.create_tag(tag)
-    logger.info(f'git push {ver}, new tag created: {out}')
+    # ветка диапазона версий при распределенной обработке истории
+    # помещается без тегов, т.к. в основную ветку ее переносит интегратор
+    push_branch = git_options.get('push_branch', '')
+    if push_branch == '':
+        # добавляем номер версии преред push
+        # теоретически должно помочь при определении
+        # новой порции кода в сонаре
+        tag = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+        out = repo.create_tag(tag)
+        logger.info(f'git push {ver}, new tag created: {out}')
 
     try:
         origin = repo.remotes['origin']
@@ -512,16 +2428,31 @@ def git_push(conf: dict, ver:  int):
         logger.exception(f'Ошибка получения удаленного репозитария, git push {ver}')
         raise ie
 
+    # ветка диапазона помещается, только пока узел владеет арендой диапазона
+    push_lease = git_options.get('push_lease', dict())
+    if push_lease:
+        check_lease(push_lease['path'], push_lease['node_id'])
+
+    manifest = None
+    if get_manifest_options(conf):
+        manifest = build_push_manifest(conf, repo, push_branch or repo.active_branch.name)
+
     # for linux only
     # origin.push(kill_after_timeout=git_options['push_timeout'])
     # Signature: ``progress(op_code, cur_count, max_count=None, message='')``.
-    origin.push(progress=lambda op_code, cur_count, max_count, message: logger.debug(f'git push ver:{ver} '
+    push_args = dict()
+    if push_branch != '':
+        push_args['refspec'] = f'+{push_branch}:{push_branch}'
+    origin.push(**push_args,
+                progress=lambda op_code, cur_count, max_count, message: logger.debug(f'git push ver:{ver} '
                                                                                      f'code:{op_code}, '
                                                                                      f'cur.count:{cur_count}, '
                                                                                      f'total:{max_count}, '
                                                                                      f'message:{message}'))
     # logger.info(f'git push out; {ver}: {out}')
     logger.info(f'Выполнение git push {ver} завершено')
+    if manifest is not None:
+        save_push_manifest(conf, repo, manifest)
 
 
 # возвращает автора коммита для сохранения версии в git
@@ -561,13 +2492,97 @@ def get_commit_label(conf: dict, version_for_dump: int, version_data: dict) -> s
         added_obj = added_obj[:512] + '...'
 
     commit_msg_prefix = git_opt['commit_msg_prefix']
-    label = f'{commit_msg_prefix} ver:{version_for_dump}; {ver_label}; \n \n{comment}\n\n' \
+    # при догоняющей выгрузке коммит содержит диапазон версий
+    ver_num = version_for_dump
+    squashed = version_data.get('SquashedVersions', list())
+    if squashed:
+        ver_num = f'{squashed[0]}-{squashed[-1]}'
+    # номер версии точки истории уже учитывает расширение и догоняющую выгрузку
+    ver_num = version_data.get('PointVersion', ver_num)
+    label = f'{commit_msg_prefix} ver:{ver_num}; {ver_label}; \n \n{comment}\n\n' \
             f'{added_obj} {changed_obj}\n'
     logger.info('Сообщение для git commit; %s', label)
 
     return label
 
 
+# записывает пакет файлов в базу объектов git командой hash-object.
+# Список путей и результат передаются через файлы, чтобы не ограничиваться размером буфера канала.
+# Фильтры (.gitattributes, autocrlf) не применяются, как и при repo.index.add.
+# Выполняется в пуле потоков, возвращает список (путь, sha)
+def hash_objects_batch(task: tuple) -> list:
+    repo_path, work_dir, num, paths = task
+    list_path = os.path.join(work_dir, f'paths_{num}.txt')
+    out_path = os.path.join(work_dir, f'objects_{num}.txt')
+    with open(list_path, mode='w', encoding='utf-8', newline='\n') as list_file:
+        list_file.write('\n'.join(paths) + '\n')
+
+    with open(list_path, mode='rb') as stdin, open(out_path, mode='wb') as stdout:
+        process = subprocess.Popen(['git', 'hash-object', '-w', '--no-filters', '--stdin-paths'], cwd=repo_path,
+                                   stdin=stdin, stdout=stdout, stderr=subprocess.PIPE)
+        _, err = process.communicate()
+    if process.returncode != 0:
+        raise ValueError(f'Ошибка git hash-object; код {process.returncode}; {err.decode(errors="replace")}')
+
+    with open(out_path, mode='r', encoding='ascii') as out_file:
+        shas = out_file.read().split()
+    if len(shas) != len(paths):
+        raise ValueError(f'git hash-object вернул {len(shas)} объектов для {len(paths)} файлов')
+
+    return list(zip(paths, shas))
+
+
+def get_index_mode(file_path: str) -> str:
+    if os.path.islink(file_path):
+        return '120000'
+    if sys.platform != 'win32' and os.access(file_path, os.X_OK):
+        return '100755'
+    return '100644'
+
+
+# помещает изменения рабочего каталога в индекс: измененные и новые файлы записываются
+# в базу объектов пакетами в hash_workers потоков, затем индекс обновляется
+# одной командой update-index --index-info, удаленные файлы удаляются из индекса
+def add_dump_to_index(conf: dict, repo: git.Repo, ver: int):
+    logger = logging.getLogger(curr_logger_id())
+    git_options = conf['git']
+    batch_size = git_options.get('hash_batch', 500)
+    paths = list()
+    deleted = list()
+    for _, path in get_changed_files(repo):
+        if os.path.lexists(os.path.join(repo.working_tree_dir, path)):
+            paths.append(path)
+        else:
+            deleted.append(path)
+
+    work_dir = tempfile.mkdtemp(prefix='hash_', dir=repo.git_dir)
+    try:
+        tasks = [(repo.working_tree_dir, work_dir, num, paths[pos:pos + batch_size])
+                 for num, pos in enumerate(range(0, len(paths), batch_size))]
+        with ThreadPool(git_options['hash_workers']) as pool:
+            hashed = [item for batch in pool.imap(hash_objects_batch, tasks) for item in batch]
+
+        index_info_path = os.path.join(work_dir, 'index_info.txt')
+        with open(index_info_path, mode='w', encoding='utf-8', newline='\n') as index_info:
+            for path, sha in hashed:
+                index_info.write(f'{get_index_mode(os.path.join(repo.working_tree_dir, path))} {sha}\t{path}\n')
+            for path in deleted:
+                index_info.write(f'0 {"0" * 40}\t{path}\n')
+        with open(index_info_path, mode='rb') as stdin:
+            result = subprocess.run(['git', 'update-index', '--index-info'], cwd=repo.working_tree_dir,
+                                    stdin=stdin, capture_output=True)
+        if result.returncode != 0:
+            raise ValueError(f'Ошибка git update-index; код {result.returncode}; '
+                             f'{result.stderr.decode(errors="replace")}')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(f'git add out; {ver}: updated {len(hashed)} file(s), removed {len(deleted)} file(s), '
+                f'batches {len(tasks)}')
+    write_metric(conf, 'git_add', {'version': ver, 'updated': len(hashed), 'removed': len(deleted),
+                                   'batches': len(tasks), 'workers': git_options['hash_workers']})
+
+
 # выполняет add, commit от имени пользователя поместившего версию в хранилище
 # а также push в соответствии с настройками. выполняется в дочернем потоке
 def git_commit_storage_version(conf: dict, version_for_dump: int, version_data: dict,
@@ -582,28 +2597,43 @@ def git_commit_storage_version(conf: dict, version_for_dump: int, version_data:
         logger.info('Начало git add; %s', version_for_dump)
         git_options = conf['git']
         repo = git.Repo(git_options['path'], search_parent_directories=False)
-        # f(path, done=False, item=item) -- ламбда для вывода результатов git add
-        try:
-            out = repo.index.add("*", True, fprogress=lambda path, done, item: logger.debug(f'git add; {version_for_dump}; {path}'))
-            add_count = len(out)
-            logger.info(f'git add out; {version_for_dump}: updated {add_count} file(s)')
-        except Exception as ex:
-            logger.exception(f'Ошибка вывода лога git add при помещении config в общий git repo; {version_for_dump}; {ex}')
+        normalize_dump(conf, repo, version_for_dump)
+        if git_options.get('hash_workers', 0) > 0:
+            add_dump_to_index(conf, repo, version_for_dump)
+        else:
+            # f(path, done=False, item=item) -- ламбда для вывода результатов git add
+            try:
+                out = repo.index.add("*", True, fprogress=lambda path, done, item: logger.debug(f'git add; {version_for_dump}; {path}'))
+                add_count = len(out)
+                logger.info(f'git add out; {version_for_dump}: updated {add_count} file(s)')
+            except Exception as ex:
+                logger.exception(f'Ошибка вывода лога git add при помещении config в общий git repo; {version_for_dump}; {ex}')
 
         logger.info('Завершено git add; %s', version_for_dump)
 
-        ver_author = version_data['Author']
-        git_author = git_author_for_version(conf, ver_author)
         label = get_commit_label(conf, version_for_dump, version_data)
-        commit_stamp = datetime.strptime(version_data['CommitDate'] + ' ' + version_data['CommitTime'], "%d.%m.%Y %H:%M:%S")
+        # коммит нескольких авторов выполняется от имени пользователя git,
+        # авторы версий перечисляются в описании
+        authors = get_version_authors(version_data)
+        if len(authors) == 1:
+            git_author = git_author_for_version(conf, authors[0])
+        else:
+            git_author = None
+            label += '\n' + '\n'.join(f'Co-authored-by: {git_author_for_version(conf, author)}'
+                                      for author in authors) + '\n'
+        commit_stamp = get_version_stamp(version_data)
 
         logger.info('Начало git commit %s', version_for_dump)
-        repo.git.commit('-m', label, author=git_author, date=commit_stamp)
+        # версия без изменений объектов не выгружается, коммит фиксирует только ее описание
+        repo.git.commit('-m', label, author=git_author, date=commit_stamp,
+                        allow_empty=version_data.get('DumpStrategy', '') == 'skip')
         logger.info('Завершено git commit; %s', version_for_dump)
 
         git_push(conf, version_for_dump)
 
-        save_last_version(conf, version_for_dump)
+        # 0 - в точке истории нет версии основной конфигурации, только версии расширений
+        if version_for_dump > 0:
+            save_last_version(conf, version_for_dump)
         logger.info('Завершено: обработка версии %s', version_for_dump)
     except Exception as ex:
         logger.exception(f'Ошибка помещения config в общий git repo; {version_for_dump}')
@@ -615,53 +2645,79 @@ def git_commit_storage_version(conf: dict, version_for_dump: int, version_data:
 
 
 # проходит по версиям хранилища от меньшей к большей
-# и выгружает данные каждой версии из истории в git
+# и выгружает данные каждой версии из истории в git.
+# Версии основной конфигурации и расширений обрабатываются по общей хронологии,
+# все источники, изменившиеся в одной точке истории, помещаются в один коммит
 def scan_history(conf: dict, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    logger.info('Начало переноса истории хранилища в git')
+    sources = get_history_sources(conf)
+    process_history_points(sources, get_history_points(sources), queue)
+    logger.info('Завершено: перенос истории хранилища в git')
+
+
+# выполняет загрузку из хранилища, выгрузку в файлы и коммит
+# для каждой точки истории в порядке их следования
+def process_history_points(sources: list, points, queue: multiprocessing.Queue):
     # при каждом запуске скрипта промежуточная конфигурация возвращается
     # к конфе базы данных, поэтому выгружать в файлы надо всю загруженную
     # из хранилища конфигурацию
-    first_dump = True
+    first_dump = {get_source_name(source): True for source in sources}
     logger = logging.getLogger(curr_logger_id())
 
-    logger.info('Начало переноса истории хранилища в git')
-    history_data = read_storage_history(conf)
-    versions = list()
-    for key in history_data.keys():
-        versions.append(int(key))
-
-    versions.sort()
     git_process = None
     prev_ver = ""
-    for ver in versions:
-        logger.info(f'Начало обработки версии {ver}')
-        version_data = history_data[str(ver)]
-        update_to_storage_version(conf, ver)  # загрузка из хранилища
-
-        # выгрузка в локальную папку git
-        if prev_ver == "":
-            logger.info(f'Начало выгрузки {ver} в локальный git')
-        else:
-            logger.info(f'Завершение процессов git для версии {prev_ver}')
-            logger.info(f'Начало выгрузки {ver} в локальный git')
-
-        dump_process = Process(target=dump_configuration_to_git, args=(conf, first_dump, ver, lock, queue))
-        dump_process.start()
-        dump_process.join()
-
-        # add, commit and push изменений в локальном git
-        git_process = Process(target=git_commit_storage_version, args=(conf, ver, version_data, lock, queue))
-        git_process.start()
-
-        # т.к. очередная версия хранилища уже загружена в основную конфигурацию,
-        # то следующая выгрузка в гит может быть инкрементной
-        first_dump = False
-        last_ver = ver
-        save_last_version(conf, last_ver)
-        logger.info(f'Завершено: обработка версии {ver}')
-    if not (git_process is None):
-        git_process.join()
-
-    logger.info('Завершено: перенос истории хранилища в git')
+    # при ошибке или потере аренды коммит предыдущей версии завершается до выхода,
+    # чтобы следующая обработка не начиналась при работающем процессе git
+    try:
+        for point in points:
+            _, ver, _ = point[0]
+            # коммит, push и номер версии основной конфигурации выполняются по настройкам основной конфигурации,
+            # версии расширений точки описываются в данных коммита
+            commit_ver = ver if get_source_name(point[0][0]) == '' else 0
+            logger.info(f'Начало обработки версии {ver}')
+            dumped = [(source, source_ver, source_data) for source, source_ver, source_data in point
+                      if not is_dump_skipped(source, source_data)]
+            # загрузка из хранилища
+            run_on_receivers(update_to_storage_version, [(source, source_ver) for source, source_ver, _ in dumped], queue)
+
+            # выгрузка в локальную папку git
+            if prev_ver == "":
+                logger.info(f'Начало выгрузки {ver} в локальный git')
+            else:
+                logger.info(f'Завершение процессов git для версии {prev_ver}')
+                logger.info(f'Начало выгрузки {ver} в локальный git')
+
+            if dumped:
+                dump_tasks = [(source, first_dump[get_source_name(source)], source_ver, source_data)
+                              for source, source_ver, source_data in dumped]
+                dump_process = Process(target=dump_configuration_to_git, args=(dump_tasks, ver, lock, queue))
+                dump_process.start()
+                dump_process.join()
+                if dump_process.exitcode != 0:
+                    raise ValueError(f'Ошибка выгрузки версии {ver} в локальный git')
+            else:
+                logger.info(f'Версия {ver} не содержит изменений объектов, выгрузка пропущена')
+
+            # add, commit and push изменений в локальном git
+            version_data = get_point_version_data(point)
+            if not dumped:
+                version_data['DumpStrategy'] = 'skip'
+            git_process = Process(target=git_commit_storage_version,
+                                  args=(sources[0], commit_ver, version_data, lock, queue))
+            git_process.start()
+
+            # т.к. очередная версия хранилища уже загружена в основную конфигурацию,
+            # то следующая выгрузка в гит может быть инкрементной
+            for source, _, _ in dumped:
+                first_dump[get_source_name(source)] = False
+            for source, source_ver, _ in point:
+                save_last_version(source, source_ver)
+            prev_ver = ver
+            logger.info(f'Завершено: обработка версии {ver}')
+    finally:
+        if not (git_process is None):
+            git_process.join()
 
 # сохраняет номер последней обработанной версии
 # для того чтобы продолжить следующую загрузку
@@ -675,8 +2731,565 @@ def save_last_version(conf: dict, last_version: int):
     logger.info(f'Сохранен номер обработанной версии {last_version}; {storage_data_path}')
 
 
+# блок первоочередной выгрузки последней версии (head-first)
+# для нового хранилища сначала выгружается и помещается в основную ветку
+# последняя версия, чтобы актуальный код сразу был доступен в git.
+# Затем вся история до этой версии выгружается в фоновом процессе в отдельную ветку
+# в отдельном рабочем каталоге (git worktree) и отдельной базе-приемнике.
+# Основная ветка в это время получает новые версии хранилища как обычно.
+# После выгрузки истории версии, помещенные в основную ветку, переносятся
+# в ветку истории, и основная ветка одной операцией push переключается на полную историю
+
+# настройки режима, пустой словарь если режим не используется
+def get_head_first_options(conf: dict) -> dict:
+    options = conf.get('head_first', dict())
+    if not options.get('enabled', False):
+        return dict()
+
+    return options
+
+
+def get_head_first_state_path(conf: dict) -> str:
+    default_path = os.path.join(os.path.dirname(get_storage_data_path(conf)), 'head_first.json')
+    return get_head_first_options(conf).get('state_path', default_path)
+
+
+def read_head_first_state(conf: dict) -> dict:
+    state_path = get_head_first_state_path(conf)
+    if not os.path.exists(state_path):
+        return dict()
+
+    return read_json_file(state_path)
+
+
+# режим применяется к хранилищу, история которого еще не выгружалась,
+# и продолжается при следующих запусках, пока история не будет восстановлена полностью
+def is_head_first_active(conf: dict) -> bool:
+    if not get_head_first_options(conf):
+        return False
+
+    state = read_head_first_state(conf)
+    if state:
+        return state['stage'] != 'done'
+
+    return get_last_storage_version(conf) == 0
+
+
+# путь к файлу ветки истории рядом с файлом основной ветки
+def get_backfill_file_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f'{root}_backfill{ext}'
+
+
+# настройки выгрузки истории: рабочий каталог ветки истории, отдельные файлы
+# номера версии, отчета и истории хранилища и отдельная база-приемник,
+# т.к. выгрузка истории выполняется одновременно с обработкой основной ветки
+def get_backfill_conf(conf: dict) -> dict:
+    options = get_head_first_options(conf)
+    backfill_conf = copy.deepcopy(conf)
+    git_options = backfill_conf['git']
+    src_path = os.path.relpath(git_options['configuration_src_path'], git_options['path'])
+    git_options['path'] = options['backfill_path']
+    git_options['configuration_src_path'] = os.path.normpath(os.path.join(options['backfill_path'], src_path))
+    git_options['push_branch'] = options['backfill_branch']
+    backfill_conf['storage']['version_path'] = options.get('version_path', f'{get_storage_data_path(conf)}.backfill')
+    for path_key in ('report_path', 'json_report_path'):
+        backfill_conf['storage'][path_key] = get_backfill_file_path(conf['storage'][path_key])
+    if 'info_base' in options:
+        backfill_conf['info_base'].update(options['info_base'])
+
+    return backfill_conf
+
+
+# хеш текущего коммита, пустая строка для репо без коммитов
+def get_head_commit(repo: git.Repo) -> str:
+    if not repo.head.is_valid():
+        return ''
+
+    return repo.head.commit.hexsha
+
+
+# выгружает последнюю версию хранилища полностью и помещает ее в основную ветку
+def publish_head_version(conf: dict, queue: multiprocessing.Queue) -> dict:
+    logger = logging.getLogger(curr_logger_id())
+    restore_bd_configuration(conf)
+    create_storage_report(conf, 0)
+    create_storage_history(conf)
+    head_ver = None
+    head_data = None
+    for ver, version_data in iter_storage_history(conf):
+        head_ver, head_data = ver, version_data
+    if head_ver is None:
+        raise ValueError('История хранилища не содержит версий')
+
+    logger.info(f'Начало выгрузки последней версии хранилища; {head_ver}')
+    repo = git.Repo(conf['git']['path'], search_parent_directories=False)
+    # репо нового хранилища обычно еще не содержит коммитов
+    base = get_head_commit(repo)
+    process_history_points([conf], [[(conf, head_ver, head_data)]], queue)
+    head = get_head_commit(repo)
+    if head == base:
+        raise ValueError(f'Последняя версия хранилища {head_ver} не помещена в git')
+
+    logger.info(f'Последняя версия хранилища помещена в основную ветку; {head_ver}')
+    return {'stage': 'backfill', 'head_version': head_ver, 'base': base, 'head': head}
+
+
+# создает рабочий каталог ветки истории. Если ветка уже существует (каталог был удален
+# после прерванной выгрузки), выгрузка продолжается в ней. Новая ветка начинается с коммита
+# основной ветки, предшествовавшего выгрузке последней версии, если основная ветка была пустой -
+# создается без родителя (orphan), а номер выгруженной в нее версии сбрасывается
+def add_backfill_worktree(conf: dict, state: dict):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_head_first_options(conf)
+    backfill_branch = options['backfill_branch']
+    backfill_path = options['backfill_path']
+    repo = git.Repo(conf['git']['path'], search_parent_directories=False)
+    repo.git.worktree('prune')
+    if backfill_branch in repo.heads:
+        repo.git.worktree('add', '-f', backfill_path, backfill_branch)
+        logger.info(f'Выгрузка истории продолжается в ветке {backfill_branch}')
+        return
+    if backfill_branch in repo.remotes['origin'].refs:
+        repo.git.worktree('add', '-f', '-B', backfill_branch, backfill_path, f'origin/{backfill_branch}')
+        logger.info(f'Выгрузка истории продолжается в ветке origin/{backfill_branch}')
+        return
+
+    version_path = get_storage_data_path(get_backfill_conf(conf))
+    if os.path.exists(version_path):
+        os.remove(version_path)
+    if state['base'] != '':
+        repo.git.worktree('add', '-f', '-B', backfill_branch, backfill_path, state['base'])
+    else:
+        # git worktree add --orphan доступна только с git 2.42
+        repo.git.worktree('add', '-f', '--detach', backfill_path, state['head'])
+        backfill_repo = git.Repo(backfill_path, search_parent_directories=False)
+        backfill_repo.git.checkout('--orphan', backfill_branch)
+        backfill_repo.git.rm('-r', '-f', '-q', '--ignore-unmatch', '.')
+
+
+# выгружает историю до последней версии в ветку истории.
+# при повторном запуске выгрузка продолжается с последней выгруженной версии
+def backfill_history(conf: dict, state: dict, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_head_first_options(conf)
+    backfill_conf = get_backfill_conf(conf)
+    head_ver = state['head_version']
+    if not os.path.exists(options['backfill_path']):
+        add_backfill_worktree(conf, state)
+
+    last_version = get_last_storage_version(backfill_conf)
+    if last_version < head_ver:
+        logger.info(f'Начало выгрузки истории хранилища в ветку {options["backfill_branch"]}; '
+                    f'версии {last_version + 1}-{head_ver}')
+        restore_bd_configuration(backfill_conf)
+        create_storage_report(backfill_conf, last_version)
+        create_storage_history(backfill_conf)
+        history = ((ver, version_data) for ver, version_data in iter_storage_history(backfill_conf)
+                   if ver <= head_ver)
+        points = ([(backfill_conf, ver, version_data)] for ver, version_data
+                  in iter_catch_up_history(backfill_conf, history))
+        process_history_points([backfill_conf], points, queue)
+
+    if get_last_storage_version(backfill_conf) < head_ver:
+        raise ValueError(f'История хранилища до версии {head_ver} выгружена не полностью')
+
+
+# выгрузка истории в дочернем процессе
+def run_backfill_history(conf: dict, state: dict, queue: multiprocessing.Queue):
+    subprocess_logger_config(conf, queue)
+    backfill_history(conf, state, queue)
+
+
+# помещает в основную ветку новые версии хранилища обычной последовательной обработкой
+def update_head_branch(conf: dict, queue: multiprocessing.Queue):
+    restore_receivers([conf])
+    create_storage_report(conf, get_last_storage_version(conf))
+    create_storage_history(conf)
+    process_history_points([conf], get_history_points([conf]), queue)
+
+
+# переносит коммит в другую ветку с сохранением автора, даты и описания
+def copy_commit(repo: git.Repo, commit: git.Commit, tree: str, parent: str) -> str:
+    env = {'GIT_AUTHOR_NAME': commit.author.name,
+           'GIT_AUTHOR_EMAIL': commit.author.email,
+           'GIT_AUTHOR_DATE': commit.authored_datetime.isoformat()}
+    return repo.git.commit_tree(tree, '-p', parent, '-m', commit.message, env=env)
+
+
+# переключает основную ветку удаленного репо на ветку истории.
+# Версии, помещенные в основную ветку после последней версии, переносятся в ветку истории:
+# каждый коммит содержит полную выгрузку, поэтому его дерево переносится без изменений.
+# --force-with-lease гарантирует, что основная ветка не изменилась после переноса
+def switch_to_backfill(conf: dict, state: dict):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_head_first_options(conf)
+    main_branch = options['main_branch']
+    backfill_branch = options['backfill_branch']
+    repo = git.Repo(conf['git']['path'], search_parent_directories=False)
+    repo.remotes['origin'].fetch()
+    main_head = repo.commit(f'origin/{main_branch}').hexsha
+    head = git.Repo(options['backfill_path'], search_parent_directories=False).head.commit.hexsha
+    commits = repo.git.rev_list('--reverse', f'{state["head"]}..{main_head}').split()
+    for sha in commits:
+        commit = repo.commit(sha)
+        head = copy_commit(repo, commit, commit.tree.hexsha, head)
+    logger.info(f'В ветку истории перенесены версии основной ветки; коммитов: {len(commits)}')
+
+    repo.git.push('origin', f'--force-with-lease={main_branch}:{main_head}', f'{head}:refs/heads/{main_branch}')
+    repo.git.worktree('remove', '--force', options['backfill_path'])
+    repo.git.checkout('-f', '-B', main_branch, f'origin/{main_branch}')
+    repo.git.branch('-D', backfill_branch)
+    repo.git.push('origin', f':{backfill_branch}')
+    logger.info(f'Основная ветка {main_branch} переключена на полную историю хранилища')
+
+
+# пока история выгружается в фоновом процессе, основная ветка
+# каждые poll_interval секунд получает новые версии хранилища
+def convert_storage_head_first(conf: dict, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_head_first_options(conf)
+    if get_receiver_key(get_backfill_conf(conf)) == get_receiver_key(conf):
+        raise ValueError('Для выгрузки истории нужна отдельная база-приемник (head_first/info_base)')
+
+    state = read_head_first_state(conf)
+    if not state:
+        state = publish_head_version(conf, queue)
+        write_json_file(get_head_first_state_path(conf), state)
+
+    backfill_process = Process(target=run_backfill_history, args=(conf, state, queue))
+    backfill_process.start()
+    while True:
+        update_head_branch(conf, queue)
+        if not backfill_process.is_alive():
+            break
+        backfill_process.join(options.get('poll_interval', 300))
+
+    if backfill_process.exitcode != 0:
+        raise ValueError('Ошибка выгрузки истории хранилища в ветку истории')
+
+    switch_to_backfill(conf, state)
+    state['stage'] = 'done'
+    write_json_file(get_head_first_state_path(conf), state)
+    logger.info('Завершена первоочередная выгрузка последней версии и восстановление истории')
+
+# завершение блока первоочередной выгрузки последней версии
+
+
+# блок распределенной обработки истории
+# несколько узлов сборки, подключенных к общей папке и общему удаленному репо,
+# захватывают диапазоны версий по аренде (lease), выгружают их в отдельные ветки,
+# а назначенный узел-интегратор по порядку переносит ветки в основную ветку.
+# Аренда - файл в общей папке, создаваемый атомарно, время изменения файла
+# обновляется узлом-владельцем, аренда без обновления дольше lease_timeout
+# считается брошенной и захватывается другим узлом
+
+class LeaseLostError(ValueError):
+    """Узел потерял аренду диапазона версий"""
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Периодически обновляет время изменения файла аренды,
+    пока узел обрабатывает захваченный диапазон версий"""
+    lease_path: str
+    node_id: str
+    interval: int
+    lost: bool
+    stop_event: threading.Event
+
+    def __init__(self, lease_path: str, node_id: str, interval: int) -> None:
+        super().__init__(daemon=True)
+        self.lease_path = lease_path
+        self.node_id = node_id
+        self.interval = interval
+        self.lost = False
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        logger = logging.getLogger(curr_logger_id())
+        while not self.stop_event.wait(self.interval):
+            if not is_lease_owner(self.lease_path, self.node_id):
+                self.lost = True
+                logger.error(f'Аренда потеряна; {self.lease_path}')
+                return
+            os.utime(self.lease_path)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+
+# настройки распределенной обработки, пустой словарь если она не используется
+def get_distributed_options(conf: dict) -> dict:
+    return conf.get('distributed', dict())
+
+
+# путь к файлу в общей папке узлов
+def get_shared_file_path(conf: dict, file_name: str) -> str:
+    return os.path.join(get_distributed_options(conf)['shared_path'], file_name)
+
+
+# имя диапазона версий, используется в именах файлов аренды и ветки git
+def get_range_name(version_range: list) -> str:
+    return f'range_{version_range[0]}_{version_range[-1]}'
+
+
+# формирует план распределенной обработки: разбивает необработанные версии
+# истории на диапазоны и копирует историю в общую папку для остальных узлов.
+# выполняется интегратором
+def create_distributed_plan(conf: dict) -> dict:
+    logger = logging.getLogger(curr_logger_id())
+    options = get_distributed_options(conf)
+    os.makedirs(options['shared_path'], exist_ok=True)
+    last_version = get_last_storage_version(conf)
+    restore_bd_configuration(conf)
+    create_storage_report(conf, last_version)
+    create_storage_history(conf)
+
+    history_path = get_shared_file_path(conf, 'storage_history.json')
+    shutil.copyfile(conf['storage']['json_report_path'], history_path)
+    versions = [ver for ver, _ in iter_history_file(history_path)]
+    range_size = options['range_size']
+    ranges = [versions[pos:pos + range_size] for pos in range(0, len(versions), range_size)]
+
+    plan = {'history_path': history_path, 'ranges': [[rng[0], rng[-1]] for rng in ranges]}
+    write_json_file(get_shared_file_path(conf, 'plan.json'), plan)
+    logger.info(f'Сформирован план распределенной обработки; диапазонов: {len(ranges)}')
+    return plan
+
+
+# ожидает появления плана, сформированного интегратором
+def read_distributed_plan(conf: dict) -> dict:
+    plan_path = get_shared_file_path(conf, 'plan.json')
+    while not os.path.exists(plan_path):
+        sleep(get_distributed_options(conf)['poll_interval'])
+
+    return read_json_file(plan_path)
+
+
+def is_lease_owner(lease_path: str, node_id: str) -> bool:
+    try:
+        return read_json_file(lease_path)['node_id'] == node_id
+    except (OSError, ValueError):
+        return False
+
+
+# состояние аренды: содержимое файла и время его изменения, None если файла нет
+def read_lease(lease_path: str):
+    try:
+        return read_json_file(lease_path), os.stat(lease_path).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+
+def is_lease_stale(conf: dict, lease) -> bool:
+    if lease is None:
+        return False
+
+    return time.time_ns() - lease[1] > get_distributed_options(conf)['lease_timeout'] * 1000000000
+
+
+# освобождает брошенную аренду. Файл аренды атомарно переименовывается, после чего проверяется,
+# что переименована та же аренда, которая была признана брошенной. Если за это время
+# другой узел успел освободить ее и захватить диапазон заново, его аренда возвращается на место
+def release_stale_lease(conf: dict, lease_path: str, stale_lease):
+    logger = logging.getLogger(curr_logger_id())
+    stale_path = f'{lease_path}.{get_distributed_options(conf)["node_id"]}.{os.getpid()}.stale'
+    try:
+        os.rename(lease_path, stale_path)
+    except OSError:
+        return
+
+    if read_lease(stale_path) == stale_lease:
+        logger.warning(f'Освобождена брошенная аренда; {lease_path}; {stale_lease[0]}')
+        os.remove(stale_path)
+        return
+
+    try:
+        # ссылка не перезаписывает аренду, созданную после переименования
+        os.link(stale_path, lease_path)
+    except OSError:
+        logger.error(f'Не удалось вернуть аренду другого узла; {lease_path}; {read_lease(stale_path)}')
+    os.remove(stale_path)
+
+
+# пытается захватить диапазон версий. Файл аренды создается атомарно (O_EXCL),
+# поэтому из нескольких узлов диапазон получает только один
+def try_claim_range(conf: dict, range_name: str) -> bool:
+    logger = logging.getLogger(curr_logger_id())
+    node_id = get_distributed_options(conf)['node_id']
+    lease_path = get_shared_file_path(conf, f'{range_name}.lease')
+    lease = read_lease(lease_path)
+    if is_lease_stale(conf, lease):
+        release_stale_lease(conf, lease_path, lease)
+
+    try:
+        lease_file = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+
+    with os.fdopen(lease_file, mode='w', encoding='utf-8') as lease:
+        json.dump({'node_id': node_id, 'pid': os.getpid(), 'claimed': datetime.now().isoformat()}, lease)
+
+    logger.info(f'Захвачен диапазон версий; {range_name}')
+    return True
+
+
+# проверяет аренду перед обработкой каждой версии диапазона:
+# узел, потерявший аренду, прекращает обработку диапазона и не помещает версии в ветку нового владельца
+def iter_leased_points(points, heartbeat: LeaseHeartbeat):
+    for point in points:
+        check_lease(heartbeat.lease_path, heartbeat.node_id, heartbeat.lost)
+        yield point
+
+
+def check_lease(lease_path: str, node_id: str, lost: bool = False):
+    if lost or not is_lease_owner(lease_path, node_id):
+        raise LeaseLostError(f'Аренда потеряна, обработка диапазона прекращена; {lease_path}')
+
+
+# выгружает диапазон версий в отдельную ветку, начиная с текущей
+# основной ветки удаленного репо. Первая версия диапазона выгружается полностью
+def process_range(conf: dict, version_range: list, history_path: str, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_distributed_options(conf)
+    range_name = get_range_name(version_range)
+    lease_path = get_shared_file_path(conf, f'{range_name}.lease')
+
+    heartbeat = LeaseHeartbeat(lease_path, options['node_id'], options['heartbeat_interval'])
+    heartbeat.start()
+    try:
+        range_conf = copy.deepcopy(conf)
+        range_conf['git']['push_branch'] = range_name
+        range_conf['git']['push_lease'] = {'path': lease_path, 'node_id': options['node_id']}
+        range_conf['storage']['version_path'] = get_shared_file_path(conf, f'{range_name}.version')
+
+        repo = git.Repo(conf['git']['path'], search_parent_directories=False)
+        repo.remotes['origin'].fetch()
+        repo.git.checkout('-f', '-B', range_name, f'origin/{options["main_branch"]}')
+        base = repo.head.commit.hexsha
+
+        restore_bd_configuration(range_conf)
+        history = ((ver, version_data) for ver, version_data in iter_history_file(history_path)
+                   if version_range[0] <= ver <= version_range[-1])
+        points = ([(range_conf, ver, version_data)] for ver, version_data in iter_catch_up_history(range_conf, history))
+        process_history_points([range_conf], iter_leased_points(points, heartbeat), queue)
+
+        if repo.head.commit.hexsha != repo.commit(f'origin/{range_name}').hexsha:
+            raise ValueError(f'Диапазон версий {range_name} помещен в удаленный репо не полностью')
+    except LeaseLostError as ex:
+        # диапазон обрабатывает новый владелец аренды, узел переходит к следующему диапазону
+        logger.error(str(ex))
+    except Exception:
+        # освобождаем аренду, чтобы диапазон сразу мог быть захвачен повторно
+        if is_lease_owner(lease_path, options['node_id']):
+            os.remove(lease_path)
+        raise
+    finally:
+        heartbeat.stop()
+
+    if heartbeat.lost or not is_lease_owner(lease_path, options['node_id']):
+        logger.error(f'Аренда диапазона {range_name} потеряна, результат не публикуется')
+        return
+
+    write_json_file(get_shared_file_path(conf, f'{range_name}.done'),
+                    {'node_id': options['node_id'], 'branch': range_name, 'base': base})
+    logger.info(f'Завершена обработка диапазона версий; {range_name}')
+
+
+# формирует дерево коммита основной ветки: папка выгрузки конфигурации
+# берется из коммита диапазона, остальные файлы - из текущей вершины основной ветки
+def get_integrated_tree(conf: dict, repo: git.Repo, head: str, commit: git.Commit) -> str:
+    src_path = os.path.relpath(conf['git']['configuration_src_path'], conf['git']['path']).replace(os.sep, '/')
+    if src_path == '.':
+        return commit.tree.hexsha
+
+    env = {'GIT_INDEX_FILE': os.path.join(repo.git_dir, 'integrate.index')}
+    repo.git.read_tree(head, env=env)
+    repo.git.rm('-r', '-f', '--cached', '-q', '--ignore-unmatch', '--', src_path, env=env)
+    repo.git.read_tree(f'--prefix={src_path}/', f'{commit.hexsha}:{src_path}', env=env)
+    return repo.git.write_tree(env=env)
+
+
+# переносит коммиты ветки диапазона в основную ветку поверх текущей вершины.
+# Каждый коммит диапазона содержит полную выгрузку конфигурации,
+# поэтому ее дерево переносится без изменений с сохранением автора, даты и описания
+def integrate_range(conf: dict, version_range: list):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_distributed_options(conf)
+    range_name = get_range_name(version_range)
+    done = read_json_file(get_shared_file_path(conf, f'{range_name}.done'))
+
+    repo = git.Repo(conf['git']['path'], search_parent_directories=False)
+    origin = repo.remotes['origin']
+    origin.fetch()
+    # основная ветка строится от состояния удаленного репо, локальная ветка интегратора может отставать
+    repo.git.checkout('-f', '-B', options['main_branch'], f'origin/{options["main_branch"]}')
+    head = repo.head.commit.hexsha
+    commits = repo.git.rev_list('--reverse', f'{done["base"]}..origin/{range_name}').split()
+    for sha in commits:
+        commit = repo.commit(sha)
+        head = copy_commit(repo, commit, get_integrated_tree(conf, repo, head, commit), head)
+
+    repo.git.reset('--hard', head)
+    git_push(conf, version_range[-1])
+    save_last_version(conf, version_range[-1])
+    origin.push(refspec=f':{range_name}')
+    write_json_file(get_shared_file_path(conf, f'{range_name}.integrated'), {'head': head})
+    logger.info(f'Диапазон версий перенесен в основную ветку; {range_name}; коммитов: {len(commits)}')
+
+
+# захватывает и обрабатывает первый свободный диапазон плана
+def process_next_range(conf: dict, plan: dict, queue: multiprocessing.Queue) -> bool:
+    for version_range in plan['ranges']:
+        range_name = get_range_name(version_range)
+        if os.path.exists(get_shared_file_path(conf, f'{range_name}.done')):
+            continue
+        if try_claim_range(conf, range_name):
+            process_range(conf, version_range, plan['history_path'], queue)
+            return True
+
+    return False
+
+
+# цикл работы узла. Интегратор формирует план (если предыдущий план выполнен),
+# переносит готовые диапазоны в основную ветку строго по порядку,
+# а в ожидании сам обрабатывает свободные диапазоны.
+# Остальные узлы обрабатывают диапазоны, пока все они не будут выполнены
+def convert_storage_distributed(conf: dict, queue: multiprocessing.Queue):
+    logger = logging.getLogger(curr_logger_id())
+    options = get_distributed_options(conf)
+    logger.info(f'Начало распределенной обработки истории; узел {options["node_id"]}')
+
+    def is_state(version_range, state):
+        return os.path.exists(get_shared_file_path(conf, f'{get_range_name(version_range)}.{state}'))
+
+    if options.get('integrator', False):
+        plan_path = get_shared_file_path(conf, 'plan.json')
+        if os.path.exists(plan_path):
+            plan = read_json_file(plan_path)
+        if not os.path.exists(plan_path) or all(is_state(rng, 'integrated') for rng in plan['ranges']):
+            plan = create_distributed_plan(conf)
+
+        for version_range in plan['ranges']:
+            while not is_state(version_range, 'integrated'):
+                if is_state(version_range, 'done'):
+                    integrate_range(conf, version_range)
+                elif not process_next_range(conf, plan, queue):
+                    sleep(options['poll_interval'])
+    else:
+        plan = read_distributed_plan(conf)
+        while not all(is_state(rng, 'done') for rng in plan['ranges']):
+            if not process_next_range(conf, plan, queue):
+                sleep(options['poll_interval'])
+
+    logger.info(f'Завершена распределенная обработка истории; узел {options["node_id"]}')
+
+# завершение блока распределенной обработки истории
+
+
 # основной скрипт. вынесен в отдельную функцию для удобства тестирования.
-def convert_storage_to_git(conf):
+def convert_storage_to_git(conf, dry_run: bool = False):
     queue = multiprocessing.Queue(-1)
     log_listener_on = multiprocessing.Queue(-1)
 
@@ -687,10 +3300,24 @@ def convert_storage_to_git(conf):
         logging.basicConfig(encoding='utf-8')
         sys.stderr.reconfigure(encoding='utf-8')
         logger.info('Запуск скрипта')
-        last_version = get_last_storage_version(conf)
-        restore_bd_configuration(conf)
-        create_storage_report(conf, last_version)
-        create_storage_history(conf)
+        # пробный запуск только выводит план и не переходит в режимы,
+        # выполняющие выгрузку и push
+        if not dry_run and get_distributed_options(conf):
+            convert_storage_distributed(conf, queue)
+            return
+        if not dry_run and is_head_first_active(conf):
+            convert_storage_head_first(conf, queue)
+            return
+
+        sources = get_history_sources(conf)
+        restore_receivers(sources)
+        for source in sources:
+            last_version = get_last_storage_version(source)
+            create_storage_report(source, last_version)
+            create_storage_history(source)
+        if dry_run:
+            print_triage_plan(sources)
+            return
         scan_history(conf, queue)
 
         logger.debug('Завершение скрипта')
@@ -704,5 +3331,5 @@ def convert_storage_to_git(conf):
 
 if __name__ == '__main__':
     conf = init_configuration()
-    convert_storage_to_git(conf)
+    convert_storage_to_git(conf, init_args().plan)
     sys.exit()
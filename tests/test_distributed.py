@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import ConvertStorage
+
+
+class LeaseTests(unittest.TestCase):
+
+    def setUp(self):
+        self.shared_path = tempfile.mkdtemp()
+        self.lease_path = os.path.join(self.shared_path, 'range_1_10.lease')
+
+    def tearDown(self):
+        shutil.rmtree(self.shared_path)
+
+    def node_conf(self, node_id: str) -> dict:
+        return {'distributed': {'shared_path': self.shared_path, 'node_id': node_id, 'lease_timeout': 60}}
+
+    def make_stale(self):
+        stamp = time.time() - 120
+        os.utime(self.lease_path, (stamp, stamp))
+
+    def write_lease(self, node_id: str):
+        with open(self.lease_path, mode='w', encoding='utf-8') as lease_file:
+            json.dump({'node_id': node_id, 'pid': 1, 'claimed': ''}, lease_file)
+
+    def test_010_claim_once(self):
+        self.assertTrue(ConvertStorage.try_claim_range(self.node_conf('a'), 'range_1_10'))
+        self.assertFalse(ConvertStorage.try_claim_range(self.node_conf('b'), 'range_1_10'))
+        self.assertTrue(ConvertStorage.is_lease_owner(self.lease_path, 'a'))
+        self.assertFalse(ConvertStorage.is_lease_owner(self.lease_path, 'b'))
+
+    def test_020_stale_lease_taken_over(self):
+        ConvertStorage.try_claim_range(self.node_conf('a'), 'range_1_10')
+        # аренда обновляется владельцем и не считается брошенной
+        self.assertFalse(ConvertStorage.try_claim_range(self.node_conf('b'), 'range_1_10'))
+        self.make_stale()
+        self.assertTrue(ConvertStorage.is_lease_stale(self.node_conf('b'), ConvertStorage.read_lease(self.lease_path)))
+        self.assertTrue(ConvertStorage.try_claim_range(self.node_conf('b'), 'range_1_10'))
+        self.assertTrue(ConvertStorage.is_lease_owner(self.lease_path, 'b'))
+        self.assertEqual(os.listdir(self.shared_path), ['range_1_10.lease'])
+
+    def test_030_reclaimed_lease_linked_back(self):
+        self.write_lease('a')
+        self.make_stale()
+        stale_lease = ConvertStorage.read_lease(self.lease_path)
+        # пока узел b проверял аренду, узел c освободил ее и захватил диапазон заново
+        os.remove(self.lease_path)
+        self.write_lease('c')
+        ConvertStorage.release_stale_lease(self.node_conf('b'), self.lease_path, stale_lease)
+        self.assertTrue(ConvertStorage.is_lease_owner(self.lease_path, 'c'))
+        self.assertEqual(os.listdir(self.shared_path), ['range_1_10.lease'])
+
+    def test_040_released_lease_missing(self):
+        self.write_lease('a')
+        self.make_stale()
+        stale_lease = ConvertStorage.read_lease(self.lease_path)
+        os.remove(self.lease_path)
+        ConvertStorage.release_stale_lease(self.node_conf('b'), self.lease_path, stale_lease)
+        self.assertEqual(os.listdir(self.shared_path), list())
+        self.assertIsNone(ConvertStorage.read_lease(self.lease_path))
+        self.assertFalse(ConvertStorage.is_lease_stale(self.node_conf('b'), None))
+
+    def test_050_check_lease(self):
+        self.write_lease('a')
+        ConvertStorage.check_lease(self.lease_path, 'a')
+        with self.assertRaises(ConvertStorage.LeaseLostError):
+            ConvertStorage.check_lease(self.lease_path, 'a', True)
+        with self.assertRaises(ConvertStorage.LeaseLostError):
+            ConvertStorage.check_lease(self.lease_path, 'b')
+        os.remove(self.lease_path)
+        with self.assertRaises(ConvertStorage.LeaseLostError):
+            ConvertStorage.check_lease(self.lease_path, 'a')
+
+    def test_060_leased_points_stop_on_loss(self):
+        self.write_lease('a')
+        heartbeat = ConvertStorage.LeaseHeartbeat(self.lease_path, 'a', 60)
+        points = ConvertStorage.iter_leased_points(iter([1, 2, 3]), heartbeat)
+        self.assertEqual(next(points), 1)
+        self.write_lease('b')
+        with self.assertRaises(ConvertStorage.LeaseLostError):
+            next(points)
+
+    def test_070_lost_range_skipped(self):
+        conf = self.node_conf('a')
+        conf['distributed'].update({'heartbeat_interval': 60, 'main_branch': 'main'})
+        conf.update({'git': {'path': self.shared_path}, 'storage': {'version_path': ''}})
+        self.write_lease('b')
+
+        def lose_lease(sources, points, queue):
+            list(points)
+
+        with mock.patch.object(ConvertStorage.git, 'Repo'), \
+                mock.patch.object(ConvertStorage, 'restore_bd_configuration'), \
+                mock.patch.object(ConvertStorage, 'iter_history_file', return_value=iter([(1, dict())])), \
+                mock.patch.object(ConvertStorage, 'iter_catch_up_history', side_effect=lambda conf, history: history), \
+                mock.patch.object(ConvertStorage, 'process_history_points', side_effect=lose_lease):
+            # узел, потерявший аренду, не прерывает работу и не публикует результат
+            ConvertStorage.process_range(conf, [1, 10], '', None)
+        self.assertTrue(ConvertStorage.is_lease_owner(self.lease_path, 'b'))
+        self.assertFalse(os.path.exists(os.path.join(self.shared_path, 'range_1_10.done')))
+
+
+if __name__ == '__main__':
+    unittest.main()
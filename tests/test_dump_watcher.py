@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import ConvertStorage
+
+
+class DumpProgressWatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.watch_path = os.path.join(self.data_path, 'src')
+        self.conf = {'onec': {'progress_interval': 0.2, 'stall_seconds': 600},
+                     'storage': {'version_path': os.path.join(self.data_path, 'version.txt')}}
+        self.oc_command = SimpleNamespace(watch_path=self.watch_path, watch_key=':full', desc='выгрузка')
+        self.stop_writing = threading.Event()
+
+    def tearDown(self):
+        self.stop_writing.set()
+        shutil.rmtree(self.data_path)
+
+    # непрерывная запись файлов, как при выгрузке большой конфигурации
+    def write_files(self):
+        num = 0
+        while not self.stop_writing.is_set():
+            with open(os.path.join(self.watch_path, f'{num}.xml'), mode='w') as dump_file:
+                dump_file.write('<a/>')
+            num += 1
+            time.sleep(0.005)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify')
+    def test_010_reported_during_continuous_writing(self):
+        watcher = ConvertStorage.DumpProgressWatcher(self.conf, self.oc_command)
+        with mock.patch.object(watcher, 'report') as report:
+            watcher.start()
+            self.assertFalse(watcher.polling)
+            writer = threading.Thread(target=self.write_files)
+            writer.start()
+            time.sleep(1)
+            self.assertGreaterEqual(report.call_count, 2)
+            # остановка наблюдения не ждет окончания записи
+            started = time.monotonic()
+            watcher.stop()
+            self.assertLess(time.monotonic() - started, 1)
+            self.stop_writing.set()
+            writer.join()
+        self.assertGreater(watcher.written_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
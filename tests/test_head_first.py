@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import git
+
+import ConvertStorage
+
+
+class HeadFirstTests(unittest.TestCase):
+
+    def setUp(self):
+        # удаленный репо - локальный bare-репо, загрузка версий из хранилища
+        # заменяется коммитом файла с номером версии
+        self.data_path = tempfile.mkdtemp()
+        git.Repo.init(os.path.join(self.data_path, 'origin.git'), bare=True, initial_branch='main')
+        work_path = os.path.join(self.data_path, 'work')
+        self.repo = git.Repo.clone_from(os.path.join(self.data_path, 'origin.git'), work_path)
+        self.repo.git.config('user.name', 'test')
+        self.repo.git.config('user.email', 'test@example.com')
+        self.conf = {'git': {'path': work_path, 'configuration_src_path': os.path.join(work_path, 'src')},
+                     'storage': {'version_path': os.path.join(self.data_path, 'version.txt'),
+                                 'report_path': os.path.join(self.data_path, 'report.txt'),
+                                 'json_report_path': os.path.join(self.data_path, 'report.json')},
+                     'info_base': {'connection_string': 'File="ib";'},
+                     'head_first': {'enabled': True, 'main_branch': 'main', 'backfill_branch': 'backfill',
+                                    'backfill_path': os.path.join(self.data_path, 'backfill'),
+                                    'info_base': {'connection_string': 'File="backfill";'},
+                                    'poll_interval': 0.1}}
+        self.history = [1, 2, 3]
+        self.new_versions = [4, 5]
+        self.patcher = mock.patch.multiple(
+            ConvertStorage, restore_bd_configuration=mock.DEFAULT, restore_receivers=mock.DEFAULT,
+            create_storage_report=mock.DEFAULT, create_storage_history=mock.DEFAULT,
+            get_last_storage_version=self.get_version, process_history_points=self.process_history_points,
+            iter_storage_history=self.iter_storage_history, iter_catch_up_history=lambda conf, history: history,
+            get_history_points=self.get_history_points)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.data_path)
+
+    def get_version(self, conf: dict) -> int:
+        version_path = conf['storage']['version_path']
+        if not os.path.exists(version_path):
+            return 0
+        with open(version_path, mode='r') as version_file:
+            return int(version_file.read())
+
+    def iter_storage_history(self, conf: dict):
+        return ((ver, dict()) for ver in self.history if ver > self.get_version(conf))
+
+    def get_history_points(self, sources: list) -> list:
+        if not self.new_versions:
+            return list()
+        return [[(sources[0], self.new_versions.pop(0), dict())]]
+
+    def process_history_points(self, sources: list, points, queue):
+        for point in points:
+            for conf, ver, version_data in point:
+                repo = git.Repo(conf['git']['path'])
+                os.makedirs(conf['git']['configuration_src_path'], exist_ok=True)
+                with open(os.path.join(conf['git']['configuration_src_path'], 'version.txt'), mode='w') as src_file:
+                    src_file.write(str(ver))
+                repo.git.add('-A')
+                repo.git.commit('-m', f'version {ver}', author=f'author{ver} <author{ver}@example.com>')
+                branch = conf['git'].get('push_branch', '')
+                repo.git.push('origin', f'+{branch}:{branch}' if branch else 'HEAD')
+                with open(conf['storage']['version_path'], mode='w') as version_file:
+                    version_file.write(str(ver))
+
+    def origin_log(self) -> list:
+        return self.repo.git.log('--format=%an %s', 'origin/main').splitlines()
+
+    def test_010_backfill_conf(self):
+        backfill_conf = ConvertStorage.get_backfill_conf(self.conf)
+        self.assertEqual(backfill_conf['git']['push_branch'], 'backfill')
+        self.assertEqual(backfill_conf['info_base']['connection_string'], 'File="backfill";')
+        self.assertEqual(backfill_conf['storage']['report_path'], os.path.join(self.data_path, 'report_backfill.txt'))
+        # основная ветка и история не используют общую базу-приемник
+        del self.conf['head_first']['info_base']
+        with self.assertRaises(ValueError):
+            ConvertStorage.convert_storage_head_first(self.conf, None)
+
+    def test_020_new_versions_during_backfill(self):
+        ConvertStorage.convert_storage_head_first(self.conf, None)
+        self.assertEqual(self.origin_log(), [f'author{ver} version {ver}' for ver in (5, 4, 3, 2, 1)])
+        self.assertEqual(self.get_version(self.conf), 5)
+        self.assertEqual(self.repo.active_branch.name, 'main')
+        self.assertNotIn('backfill', self.repo.heads)
+        self.assertEqual(ConvertStorage.read_head_first_state(self.conf)['stage'], 'done')
+
+    def test_030_worktree_recreated_from_branch(self):
+        self.new_versions = list()
+        state = ConvertStorage.publish_head_version(self.conf, None)
+        ConvertStorage.write_json_file(ConvertStorage.get_head_first_state_path(self.conf), state)
+        backfill_conf = ConvertStorage.get_backfill_conf(self.conf)
+        ConvertStorage.add_backfill_worktree(self.conf, state)
+        self.process_history_points([backfill_conf], [[(backfill_conf, 1, dict())]], None)
+        # рабочий каталог удален, выгрузка продолжается в существующей ветке
+        shutil.rmtree(self.conf['head_first']['backfill_path'])
+        ConvertStorage.convert_storage_head_first(self.conf, None)
+        self.assertEqual(self.origin_log(), [f'author{ver} version {ver}' for ver in (3, 2, 1)])
+
+    def test_040_version_reset_without_branch(self):
+        state = ConvertStorage.publish_head_version(self.conf, None)
+        backfill_conf = ConvertStorage.get_backfill_conf(self.conf)
+        with open(backfill_conf['storage']['version_path'], mode='w') as version_file:
+            version_file.write('2')
+        ConvertStorage.add_backfill_worktree(self.conf, state)
+        self.assertEqual(self.get_version(backfill_conf), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import ConvertStorage
+
+
+def version_data(author: str, changed: list = None, added: list = None, date: str = '01.02.2022',
+                 time_str: str = '10:00:00') -> dict:
+    return {'Version': '1.0', 'CommitMessage': f'комментарий {author}', 'Author': author,
+            'CommitDate': date, 'CommitTime': time_str,
+            'ChangedObjects': changed or list(), 'AddedObjects': added or list()}
+
+
+# история хранилища в том виде, в котором ее формирует обработка преобразования отчета:
+# объект, ключи которого - номера версий
+HISTORY = {
+    '10': version_data('Иванов', ['Справочник.Товары', 'Документ.Заказ'], time_str='12:00:00'),
+    '2': version_data('Петров', added=['Справочник.Товары'], time_str='10:00:00'),
+    '3': version_data('Иванов', ['Справочник.Товары'], time_str='11:00:00'),
+}
+
+
+class JsonObjectItemsTests(unittest.TestCase):
+
+    def test_010_chunk_boundaries(self):
+        data = {'1': {'a': 'строка с \\"кавычками\\" и \\u0020', 'b': [1, 2.5, None, True]},
+                '2': {'вложенный': {'x': {}, 'y': []}},
+                '3': 'значение'}
+        text = json.dumps(data, ensure_ascii=False, indent='\t')
+        # при любом размере блока значения, попадающие на границу блоков, читаются целиком
+        for chunk_size in range(1, 20):
+            items = list(ConvertStorage.iter_json_object_items(io.StringIO(text), chunk_size))
+            self.assertEqual(items, list(data.items()), f'размер блока {chunk_size}')
+
+    def test_020_empty_object(self):
+        for text in ('{}', ' { \r\n } '):
+            self.assertEqual(list(ConvertStorage.iter_json_object_items(io.StringIO(text), 1)), list())
+
+    def test_030_invalid_format(self):
+        with self.assertRaises(ValueError):
+            list(ConvertStorage.iter_json_object_items(io.StringIO('[1, 2]')))
+        with self.assertRaises(ValueError):
+            list(ConvertStorage.iter_json_object_items(io.StringIO('{"1": {"a": 1}')))
+
+
+class HistoryCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.history_path = os.path.join(self.data_path, 'history.json')
+        self.write_history(HISTORY)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def write_history(self, history: dict):
+        with open(self.history_path, mode='w', encoding='utf-8-sig') as history_file:
+            json.dump(history, history_file, ensure_ascii=False)
+
+    def test_010_versions_in_order(self):
+        history = list(ConvertStorage.iter_history_file(self.history_path))
+        self.assertEqual([ver for ver, _ in history], [2, 3, 10])
+        self.assertEqual(history[0][1], HISTORY['2'])
+        self.assertEqual(history[2][1], HISTORY['10'])
+        # повторяющиеся строки в данных версий - один экземпляр
+        self.assertIs(history[1][1]['Author'], history[2][1]['Author'])
+
+    def test_020_empty_history(self):
+        self.write_history(dict())
+        self.assertEqual(list(ConvertStorage.iter_history_file(self.history_path)), list())
+
+    def test_030_cache_reused_for_regenerated_file(self):
+        list(ConvertStorage.iter_history_file(self.history_path))
+        # файл истории формируется при каждом запуске заново с тем же содержимым
+        os.remove(self.history_path)
+        time.sleep(0.01)
+        self.write_history(HISTORY)
+        with mock.patch.object(ConvertStorage, 'build_history_cache',
+                               wraps=ConvertStorage.build_history_cache) as build:
+            history = list(ConvertStorage.iter_history_file(self.history_path))
+        build.assert_not_called()
+        self.assertEqual([ver for ver, _ in history], [2, 3, 10])
+
+    def test_040_cache_rebuilt_for_changed_file(self):
+        list(ConvertStorage.iter_history_file(self.history_path))
+        changed_history = dict(HISTORY)
+        changed_history['11'] = version_data('Сидоров', ['Справочник.Контрагенты'], time_str='13:00:00')
+        self.write_history(changed_history)
+        with mock.patch.object(ConvertStorage, 'build_history_cache',
+                               wraps=ConvertStorage.build_history_cache) as build:
+            history = list(ConvertStorage.iter_history_file(self.history_path))
+        build.assert_called_once()
+        self.assertEqual([ver for ver, _ in history], [2, 3, 10, 11])
+        self.assertEqual(history[-1][1]['Author'], 'Сидоров')
+
+
+class SquashHistoryTests(unittest.TestCase):
+
+    def squash(self, options: dict, history: list) -> list:
+        return list(ConvertStorage.squash_history(options, history))
+
+    def test_010_same_author(self):
+        history = [(1, version_data('a', ['Справочник.Товары'], time_str='10:00:00')),
+                   (2, version_data('a', ['Документ.Заказ'], time_str='10:05:00')),
+                   (3, version_data('a', ['Справочник.Товары'], time_str='10:30:00')),
+                   (4, version_data('b', time_str='10:31:00'))]
+        squashed = self.squash({'same_author_minutes': 10}, history)
+        self.assertEqual([ver for ver, _ in squashed], [2, 3, 4])
+        self.assertEqual(squashed[0][1]['SquashedVersions'], [1, 2])
+        self.assertEqual(squashed[0][1]['ChangedObjects'], ['Справочник.Товары', 'Документ.Заказ'])
+        self.assertEqual(squashed[0][1]['Authors'], ['a'])
+        # одиночная версия не изменяется
+        self.assertIs(squashed[1][1], history[2][1])
+
+    def test_020_keep_every(self):
+        history = [(ver, version_data('a' if ver % 2 else 'b', [f'Справочник.С{ver}'], date=date))
+                   for ver, date in enumerate(['01.01.2021'] * 5 + ['01.01.2022'] * 2, start=1)]
+        squashed = self.squash({'keep_every': 3, 'keep_every_before': '01.01.2022'}, history)
+        self.assertEqual([ver for ver, _ in squashed], [3, 5, 6, 7])
+        self.assertEqual(squashed[0][1]['SquashedVersions'], [1, 2, 3])
+        self.assertEqual(squashed[0][1]['Authors'], ['a', 'b'])
+        self.assertIn('ver:2; 1.0; b;', squashed[0][1]['CommitMessage'])
+
+    def test_030_both_rules_cap_group(self):
+        history = [(ver, version_data(author, time_str=f'10:0{ver}:00', date='01.01.2021'))
+                   for ver, author in enumerate(['a', 'b', 'b', 'b', 'b'], start=1)]
+        options = {'same_author_minutes': 10, 'keep_every': 3, 'keep_every_before': '01.01.2022'}
+        squashed = self.squash(options, history)
+        self.assertEqual([data.get('SquashedVersions', [ver]) for ver, data in squashed], [[1, 2, 3], [4, 5]])
+        self.assertEqual(squashed[0][1]['Authors'], ['a', 'b'])
+        self.assertEqual(squashed[1][1]['Authors'], ['b'])
+
+    def test_040_configuration_version_boundary(self):
+        history = [(1, version_data('a', time_str='10:00:00')),
+                   (2, version_data('a', time_str='10:01:00')),
+                   (3, dict(version_data('a', time_str='10:02:00'), Version='1.1')),
+                   (4, dict(version_data('a', time_str='10:03:00'), Version='1.1'))]
+        squashed = self.squash({'same_author_minutes': 10}, history)
+        self.assertEqual([data['SquashedVersions'] for _, data in squashed], [[1, 2], [3, 4]])
+        self.assertEqual(squashed[1][1]['Version'], '1.1')
+
+    def test_050_empty_history(self):
+        self.assertEqual(self.squash({'same_author_minutes': 10}, []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sys import platform
+from unittest import mock
+
+import ConvertStorage
+
+
+class IbcmdBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        # вместо ibcmd запускается скрипт, сохраняющий полученные аргументы
+        # и завершающийся с кодом из переменной окружения IBCMD_EXIT
+        self.data_path = tempfile.mkdtemp()
+        self.args_path = os.path.join(self.data_path, 'ibcmd_args.txt')
+        if platform == 'win64' or platform == 'win32':
+            ibcmd_path = os.path.join(self.data_path, 'ibcmd.cmd')
+            script = f'@echo %* > "{self.args_path}"\n@exit /b %IBCMD_EXIT%\n'
+        else:
+            ibcmd_path = os.path.join(self.data_path, 'ibcmd')
+            script = f'#!/bin/sh\necho "$@" > "{self.args_path}"\nexit $IBCMD_EXIT\n'
+        with open(ibcmd_path, mode='w') as ibcmd_file:
+            ibcmd_file.write(script)
+        os.chmod(ibcmd_path, 0o755)
+
+        self.conf = {
+            'onec': {'backend': 'ibcmd', 'ibcmd_path': ibcmd_path, 'timeout': 60, 'update_timeout': 60,
+                     'dump_timeout': 60},
+            'info_base': {'connection_string': f'File="{os.path.join(self.data_path, "ib")}";',
+                          'windows_auth': False, 'user': 'Администратор', 'password': ''},
+            'storage': {'path': os.path.join(self.data_path, 'storage'), 'user': 'git', 'password': '',
+                        'version_path': os.path.join(self.data_path, 'version.json')},
+            'git': {'configuration_src_path': os.path.join(self.data_path, 'src')}}
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def read_args(self) -> str:
+        with open(self.args_path, mode='r') as args_file:
+            return args_file.read()
+
+    def test_010_update_to_storage_version(self):
+        with mock.patch.dict(os.environ, {'IBCMD_EXIT': '0'}):
+            ConvertStorage.update_to_storage_version(self.conf, 1)
+        args = self.read_args()
+        self.assertIn('infobase config repository update', args)
+        self.assertIn('--version=1', args)
+        self.assertIn('--user=Администратор', args)
+
+    def test_020_incremental_dump(self):
+        with mock.patch.dict(os.environ, {'IBCMD_EXIT': '0'}):
+            ConvertStorage.dump_source_to_git(self.conf, False, 2)
+        args = self.read_args()
+        self.assertIn('infobase config export', args)
+        self.assertIn('--sync', args)
+
+    def test_030_exit_code_is_error(self):
+        with mock.patch.dict(os.environ, {'IBCMD_EXIT': '1'}):
+            with self.assertRaises(ValueError):
+                ConvertStorage.dump_source_to_git(self.conf, True, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
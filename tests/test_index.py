@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import git
+
+import ConvertStorage
+
+
+class AddDumpToIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        self.repo = git.Repo.init(self.repo_path)
+        self.repo.git.config('user.name', 'test')
+        self.repo.git.config('user.email', 'test@example.com')
+        self.repo.git.config('core.autocrlf', 'false')
+        self.metrics_path = os.path.join(self.repo_path, '.git', 'metrics.json')
+        self.conf = {'git': {'hash_workers': 2, 'hash_batch': 1}, 'metrics': {'path': self.metrics_path}}
+        self.write('src/Catalogs/Товары.xml', '1')
+        self.write('src/Documents/Заказ.xml', '1')
+        self.write('src/Configuration.xml', '1')
+        self.repo.git.add('-A')
+        self.repo.git.commit('-m', 'init')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path)
+
+    def write(self, path: str, data: str):
+        full_path = os.path.join(self.repo_path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, mode='w', encoding='utf-8', newline='') as src_file:
+            src_file.write(data)
+
+    def staged(self) -> list:
+        out = self.repo.git.diff('--cached', '--name-status', '--no-renames', '-z')
+        return sorted(ConvertStorage.parse_name_status(out))
+
+    def test_010_changes_added(self):
+        self.write('src/Catalogs/Товары.xml', '2\r\n')
+        self.write('src/Catalogs/Новый справочник.xml', '1')
+        self.write('src/Common Modules/Общий модуль/Ext/Module.bsl', 'Процедура А()\nКонецПроцедуры\n')
+        os.remove(os.path.join(self.repo_path, 'src', 'Documents', 'Заказ.xml'))
+        ConvertStorage.add_dump_to_index(self.conf, self.repo, 2)
+
+        self.assertEqual(self.staged(), [('A', 'src/Catalogs/Новый справочник.xml'),
+                                         ('A', 'src/Common Modules/Общий модуль/Ext/Module.bsl'),
+                                         ('D', 'src/Documents/Заказ.xml'),
+                                         ('M', 'src/Catalogs/Товары.xml')])
+        # в рабочем каталоге не осталось неиндексированных изменений,
+        # индекс совпадает с результатом git add -A
+        self.assertEqual(self.repo.git.diff('--name-only'), '')
+        self.assertEqual(self.repo.untracked_files, list())
+        tree = self.repo.git.write_tree()
+        self.repo.git.add('-A')
+        self.assertEqual(self.repo.git.write_tree(), tree)
+
+        # каждый файл в отдельном пакете
+        with open(self.metrics_path, encoding='utf-8') as metrics_file:
+            report = json.loads(metrics_file.readline())
+        self.assertEqual((report['updated'], report['removed'], report['batches']), (3, 1, 3))
+        # временные файлы удалены
+        self.assertFalse(any(name.startswith('hash_') for name in os.listdir(self.repo.git_dir)))
+
+    def test_020_no_changes(self):
+        ConvertStorage.add_dump_to_index(self.conf, self.repo, 2)
+        self.assertEqual(self.staged(), list())
+
+    @unittest.skipIf(os.name == 'nt', 'права на выполнение')
+    def test_030_executable_mode(self):
+        self.write('src/run.sh', '#!/bin/sh\n')
+        os.chmod(os.path.join(self.repo_path, 'src', 'run.sh'), 0o755)
+        ConvertStorage.add_dump_to_index(self.conf, self.repo, 2)
+        self.assertTrue(self.repo.git.ls_files('-s', 'src/run.sh').startswith('100755 '))
+
+
+if __name__ == '__main__':
+    unittest.main()
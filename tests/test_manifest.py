@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import git
+
+import ConvertStorage
+
+
+class PathObjectNameTests(unittest.TestCase):
+
+    def test_010_objects(self):
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/Catalogs/Товары.xml'), 'Catalog.Товары')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/Catalogs/Товары/Ext/ObjectModule.bsl'),
+                         'Catalog.Товары')
+        self.assertEqual(ConvertStorage.get_path_object_name('.', 'CommonModules/Сервер/Ext/Module.bsl'),
+                         'CommonModule.Сервер')
+
+    def test_020_kind_dirs(self):
+        # папки видов, имя которых не образуется добавлением "s"
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/ChartsOfAccounts/Хозрасчетный.xml'),
+                         'ChartOfAccounts.Хозрасчетный')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/BusinessProcesses/Задание/Ext/Module.bsl'),
+                         'BusinessProcess.Задание')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/FilterCriteria/Отбор.xml'),
+                         'FilterCriterion.Отбор')
+
+    def test_030_configuration_and_other_files(self):
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/Configuration.xml'), 'Configuration')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/Ext/SessionModule.bsl'), 'Configuration')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src/ConfigDumpInfo.xml'), '')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'README.md'), '')
+        self.assertEqual(ConvertStorage.get_path_object_name('src', 'src2/Catalogs/Товары.xml'), '')
+
+
+class PushManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        git.Repo.init(os.path.join(self.data_path, 'origin.git'), bare=True, initial_branch='main')
+        work_path = os.path.join(self.data_path, 'work')
+        self.repo = git.Repo.clone_from(os.path.join(self.data_path, 'origin.git'), work_path)
+        self.repo.git.config('user.name', 'test')
+        self.repo.git.config('user.email', 'test@example.com')
+        self.conf = {'git': {'path': work_path, 'configuration_src_path': os.path.join(work_path, 'src')}}
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def commit(self, files: dict, ver: int, author: str):
+        for path, data in files.items():
+            full_path = os.path.join(self.repo.working_dir, path)
+            if data is None:
+                os.remove(full_path)
+                continue
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, mode='w', encoding='utf-8') as src_file:
+                src_file.write(data)
+        self.repo.git.add('-A')
+        self.repo.git.commit('-m', f'ver:{ver}; 1.{ver}; {author}; 01.02.2022 10:00:00',
+                             author=f'{author} <{author}@example.com>')
+
+    def test_010_first_push(self):
+        self.commit({'src/Catalogs/Товары.xml': '1', 'src/ConfigDumpInfo.xml': '1'}, 1, 'ivanov')
+        self.commit({'src/ChartsOfAccounts/Хозрасчетный.xml': '1'}, 2, 'petrov')
+        manifest = ConvertStorage.build_push_manifest(self.conf, self.repo, 'main')
+
+        # ветки в удаленном репо еще нет: в манифест попадают все файлы
+        self.assertEqual(manifest['base'], '')
+        self.assertEqual(manifest['head'], self.repo.head.commit.hexsha)
+        self.assertEqual(sorted((item['status'], item['path']) for item in manifest['files']),
+                         [('A', 'src/Catalogs/Товары.xml'), ('A', 'src/ChartsOfAccounts/Хозрасчетный.xml'),
+                          ('A', 'src/ConfigDumpInfo.xml')])
+        self.assertEqual(manifest['objects'], ['Catalog.Товары', 'ChartOfAccounts.Хозрасчетный'])
+        self.assertEqual([(group['version'], group['email'], group['objects']) for group in manifest['versions']],
+                         [('1', 'ivanov@example.com', ['Catalog.Товары']),
+                          ('2', 'petrov@example.com', ['ChartOfAccounts.Хозрасчетный'])])
+
+    def test_020_changes_since_push_grouped_by_version_and_author(self):
+        self.commit({'src/Catalogs/Товары.xml': '1', 'src/Documents/Заказ.xml': '1'}, 1, 'ivanov')
+        self.repo.git.push('origin', 'main')
+        self.commit({'src/Catalogs/Товары.xml': '2'}, 2, 'petrov')
+        self.commit({'src/Catalogs/Товары/Ext/ObjectModule.bsl': '2'}, 2, 'petrov')
+        self.commit({'src/Documents/Заказ.xml': None}, 2, 'sidorov')
+        self.commit({'src/Configuration.xml': '3'}, 3, 'petrov')
+        manifest = ConvertStorage.build_push_manifest(self.conf, self.repo, 'main')
+
+        self.assertEqual(manifest['base'], self.repo.commit('origin/main').hexsha)
+        self.assertEqual(sorted((item['status'], item['path']) for item in manifest['files']),
+                         [('A', 'src/Catalogs/Товары/Ext/ObjectModule.bsl'), ('A', 'src/Configuration.xml'),
+                          ('D', 'src/Documents/Заказ.xml'), ('M', 'src/Catalogs/Товары.xml')])
+        self.assertEqual(manifest['objects'], ['Catalog.Товары', 'Configuration', 'Document.Заказ'])
+
+        groups = [(group['version'], group['author'], len(group['commits']), group['objects'])
+                  for group in manifest['versions']]
+        self.assertEqual(groups, [('2', 'petrov', 2, ['Catalog.Товары']),
+                                  ('2', 'sidorov', 1, ['Document.Заказ']),
+                                  ('3', 'petrov', 1, ['Configuration'])])
+        self.assertEqual(sorted((item['status'], item['path']) for item in manifest['versions'][0]['files']),
+                         [('A', 'src/Catalogs/Товары/Ext/ObjectModule.bsl'), ('M', 'src/Catalogs/Товары.xml')])
+
+
+if __name__ == '__main__':
+    unittest.main()
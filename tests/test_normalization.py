@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import git
+
+import ConvertStorage
+
+
+class NormalizationRulesTests(unittest.TestCase):
+
+    def test_010_bom(self):
+        self.assertEqual(ConvertStorage.normalize_remove_bom(b'\xef\xbb\xbf<a/>'), b'<a/>')
+        self.assertEqual(ConvertStorage.normalize_remove_bom(b'<a/>'), b'<a/>')
+        self.assertEqual(ConvertStorage.normalize_add_bom(b'<a/>'), b'\xef\xbb\xbf<a/>')
+        self.assertEqual(ConvertStorage.normalize_add_bom(b'\xef\xbb\xbf<a/>'), b'\xef\xbb\xbf<a/>')
+
+    def test_020_line_endings(self):
+        self.assertEqual(ConvertStorage.normalize_lf(b'a\r\nb\nc\r\n'), b'a\nb\nc\n')
+        self.assertEqual(ConvertStorage.normalize_crlf(b'a\r\nb\nc'), b'a\r\nb\r\nc')
+
+    def test_030_trailing_spaces(self):
+        self.assertEqual(ConvertStorage.normalize_strip_trailing_spaces(b'a \t\r\n b  \nc\t'), b'a\r\n b\nc')
+
+    def test_040_sort_attributes(self):
+        data = '<Properties z="1" a=\'2\' m = "3"/>\n<Name>Товары</Name>\n'.encode('utf-8')
+        self.assertEqual(ConvertStorage.normalize_sort_attributes(data),
+                         '<Properties a=\'2\' m="3" z="1"/>\n<Name>Товары</Name>\n'.encode('utf-8'))
+
+    def test_050_attribute_values_with_gt(self):
+        data = b'<Item title="a > b" id="1"><Text expr="x>1" lang="ru">x &gt; 1</Text></Item>'
+        self.assertEqual(ConvertStorage.normalize_sort_attributes(data),
+                         b'<Item id="1" title="a > b"><Text expr="x>1" lang="ru">x &gt; 1</Text></Item>')
+
+    def test_060_namespaces_first_in_original_order(self):
+        data = b'<MetaDataObject version="2.15" xmlns:xr="xr" xmlns="md" b="1" xmlns:app="app">'
+        self.assertEqual(ConvertStorage.normalize_sort_attributes(data),
+                         b'<MetaDataObject xmlns:xr="xr" xmlns="md" xmlns:app="app" b="1" version="2.15">')
+
+    def test_070_declaration_and_comments_unchanged(self):
+        data = b'<?xml version="1.0" encoding="UTF-8"?>\n<!-- b="1" a="2" -->\n<a/>'
+        self.assertEqual(ConvertStorage.normalize_sort_attributes(data), data)
+
+
+class NormalizeFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.work_path, 'Catalog.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path)
+
+    def write(self, data: bytes):
+        with open(self.file_path, 'wb') as test_file:
+            test_file.write(data)
+        # время изменения в прошлом, чтобы перезапись была заметна
+        os.utime(self.file_path, ns=(1000000000, 1000000000))
+
+    def read(self) -> bytes:
+        with open(self.file_path, 'rb') as test_file:
+            return test_file.read()
+
+    def test_010_rewritten_when_changed(self):
+        self.write(b'\xef\xbb\xbf<a b="1" a="2"/>\r\n')
+        head_sha = ConvertStorage.get_git_blob_sha(b'<a a="2" b="1"/>\n')
+        result = ConvertStorage.normalize_file((self.file_path, ['remove_bom', 'lf', 'sort_attributes'], head_sha))
+        self.assertEqual(result, (self.file_path, 21, 17, True, True))
+        self.assertEqual(self.read(), b'<a a="2" b="1"/>\n')
+
+    def test_020_not_rewritten_when_unchanged(self):
+        self.write(b'<a a="2" b="1"/>\n')
+        result = ConvertStorage.normalize_file((self.file_path, ['remove_bom', 'lf', 'sort_attributes'], ''))
+        self.assertEqual(result, (self.file_path, 17, 17, False, False))
+        self.assertEqual(os.stat(self.file_path).st_mtime_ns, 1000000000)
+
+    def test_030_rules_by_extension(self):
+        options = {'rules': {'.xml': ['lf'], '.bsl': ['crlf']}, 'exclude': ['ConfigDumpInfo.xml']}
+        self.assertEqual(ConvertStorage.get_normalization_rules(options, 'src/Catalogs/Товары.XML'), ['lf'])
+        self.assertEqual(ConvertStorage.get_normalization_rules(options, 'src/Module.bsl'), ['crlf'])
+        self.assertEqual(ConvertStorage.get_normalization_rules(options, 'src/ConfigDumpInfo.xml'), list())
+        self.assertEqual(ConvertStorage.get_normalization_rules(options, 'src/Picture.png'), list())
+
+
+class NormalizeDumpTests(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        self.repo = git.Repo.init(self.repo_path)
+        self.repo.git.config('user.name', 'test')
+        self.repo.git.config('user.email', 'test@example.com')
+        self.repo.git.config('core.autocrlf', 'false')
+        self.metrics_path = os.path.join(self.repo_path, '.git', 'metrics.json')
+        self.conf = {'metrics': {'path': self.metrics_path},
+                     'normalization': {'enabled': True, 'processes': 2,
+                                       'rules': {'.xml': ['remove_bom', 'lf', 'sort_attributes']}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path)
+
+    def write(self, path: str, data: bytes):
+        full_path = os.path.join(self.repo_path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as test_file:
+            test_file.write(data)
+
+    def read(self, path: str) -> bytes:
+        with open(os.path.join(self.repo_path, path), 'rb') as test_file:
+            return test_file.read()
+
+    def test_010_changed_files_normalized(self):
+        self.write('src/Catalogs/Товары.xml', b'<a a="1" b="2"/>\n')
+        self.write('src/Module.bsl', b'a\r\n')
+        self.repo.git.add('-A')
+        self.repo.git.commit('-m', 'init')
+
+        # та же выгрузка с другим порядком атрибутов, BOM и переводами строк
+        self.write('src/Catalogs/Товары.xml', b'\xef\xbb\xbf<a b="2" a="1"/>\r\n')
+        self.write('src/Catalogs/Новый справочник.xml', b'<a b="2" a="1"/>')
+        self.write('src/Module.bsl', b'b\r\n')
+        ConvertStorage.normalize_dump(self.conf, self.repo, 5)
+
+        self.assertEqual(self.read('src/Catalogs/Товары.xml'), b'<a a="1" b="2"/>\n')
+        self.assertEqual(self.read('src/Catalogs/Новый справочник.xml'), b'<a a="1" b="2"/>')
+        # файлы без правил не изменяются
+        self.assertEqual(self.read('src/Module.bsl'), b'b\r\n')
+        # файл, совпавший после нормализации с HEAD, не попадает в коммит
+        self.assertEqual(sorted(ConvertStorage.get_changed_files(self.repo)),
+                         [(' M', 'src/Module.bsl'), ('??', 'src/Catalogs/Новый справочник.xml')])
+
+        with open(self.metrics_path, encoding='utf-8') as metrics_file:
+            report = json.loads(metrics_file.readline())
+        self.assertEqual(report['name'], 'normalization')
+        self.assertEqual(report['files_checked'], 2)
+        self.assertEqual(report['files_normalized'], 2)
+        self.assertEqual(report['files_unchanged_after_normalization'], 1)
+        self.assertEqual(report['bytes_reduced'], 4)
+
+    def test_020_disabled(self):
+        self.write('a.xml', b'\xef\xbb\xbf<a b="2" a="1"/>')
+        self.conf['normalization']['enabled'] = False
+        ConvertStorage.normalize_dump(self.conf, self.repo, 1)
+        self.assertEqual(self.read('a.xml'), b'\xef\xbb\xbf<a b="2" a="1"/>')
+        self.assertFalse(os.path.exists(self.metrics_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
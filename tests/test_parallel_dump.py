@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import ConvertStorage
+
+
+CONFIG_DUMP_INFO = '''<?xml version="1.0" encoding="UTF-8"?>
+<ConfigDumpInfo xmlns="http://v8.1c.ru/8.3/xcf/dumpinfo" format="Hierarchical" version="2.15">
+	<ConfigVersions>
+		<Metadata name="Catalog.Товары" id="1" configVersion="a1"/>
+		<Metadata name="Document.Заказ" id="2" configVersion="b1"/>
+	</ConfigVersions>
+</ConfigDumpInfo>
+'''
+
+
+class SplitDumpObjectsTests(unittest.TestCase):
+
+    objects = {'Catalog.А': ['Catalog.А'] * 6, 'Catalog.Б': ['Catalog.Б'] * 3,
+               'Document.В': ['Document.В'] * 4, 'CommonModule.Г': ['CommonModule.Г']}
+
+    def test_010_by_size(self):
+        parts = ConvertStorage.split_dump_objects(self.objects, 2, '')
+        self.assertEqual(sorted(len(part) for part in parts), [7, 7])
+        self.assertEqual(sorted(sum(parts, list())), sorted(sum(self.objects.values(), list())))
+
+    def test_020_by_kind(self):
+        parts = ConvertStorage.split_dump_objects(self.objects, 2, 'kind')
+        self.assertEqual(len(parts), 2)
+        # все справочники в одной части
+        self.assertEqual(sorted({name.split('.')[0] for name in parts[0]}), ['Catalog'])
+        self.assertEqual(sorted({name.split('.')[0] for name in parts[1]}), ['CommonModule', 'Document'])
+
+    def test_030_empty_parts_dropped(self):
+        parts = ConvertStorage.split_dump_objects({'Catalog.А': ['Catalog.А']}, 3, '')
+        self.assertEqual(parts, [['Catalog.А']])
+
+
+class MergeDumpPartTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.data_path, 'src')
+        os.makedirs(self.src_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def write(self, path: str, data: str):
+        full_path = os.path.join(self.data_path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, mode='w', encoding='utf-8') as dump_file:
+            dump_file.write(data)
+
+    def read(self, path: str) -> str:
+        with open(os.path.join(self.data_path, path), mode='r', encoding='utf-8') as dump_file:
+            return dump_file.read()
+
+    def test_010_parts_merged(self):
+        self.write('part_0/Catalogs/Товары.xml', 'товары')
+        self.write('part_0/Catalogs/Товары/Ext/ObjectModule.bsl', 'модуль')
+        self.write('part_0/ConfigDumpInfo.xml', 'часть 0')
+        self.write('part_1/Documents/Заказ.xml', 'заказ')
+        # общий файл с одинаковым содержимым допустим
+        self.write('part_1/Catalogs/Товары.xml', 'товары')
+        for num in range(2):
+            ConvertStorage.merge_dump_part(os.path.join(self.data_path, f'part_{num}'), self.src_path)
+
+        self.assertEqual(self.read('src/Catalogs/Товары.xml'), 'товары')
+        self.assertEqual(self.read('src/Catalogs/Товары/Ext/ObjectModule.bsl'), 'модуль')
+        self.assertEqual(self.read('src/Documents/Заказ.xml'), 'заказ')
+        # ConfigDumpInfo.xml части не переносится
+        self.assertFalse(os.path.exists(os.path.join(self.src_path, 'ConfigDumpInfo.xml')))
+
+    def test_020_conflicting_file(self):
+        self.write('part_0/Catalogs/Товары.xml', 'товары')
+        self.write('part_1/Catalogs/Товары.xml', 'другие товары')
+        ConvertStorage.merge_dump_part(os.path.join(self.data_path, 'part_0'), self.src_path)
+        with self.assertRaises(ValueError):
+            ConvertStorage.merge_dump_part(os.path.join(self.data_path, 'part_1'), self.src_path)
+        self.assertEqual(self.read('src/Catalogs/Товары.xml'), 'товары')
+
+
+class ParallelFullDumpTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.dump_path = os.path.join(self.data_path, 'parallel_dump')
+        self.src_path = os.path.join(self.data_path, 'src')
+        infobase_path = os.path.join(self.data_path, 'ib')
+        os.makedirs(infobase_path)
+        with open(os.path.join(infobase_path, '1Cv8.1CD'), mode='wb') as db_file:
+            db_file.write(b'ib')
+        self.conf = {'info_base': {'connection_string': f'File="{infobase_path}";'},
+                     'git': {'configuration_src_path': self.src_path},
+                     'parallel_dump': {'receivers': 2, 'path': self.dump_path}}
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    # вместо 1С ConfigDumpInfo.xml записывается в папку команды
+    def execute_command(self, conf: dict, oc_command):
+        info_path = os.path.join(self.dump_path, 'info')
+        os.makedirs(info_path, exist_ok=True)
+        with open(os.path.join(info_path, 'ConfigDumpInfo.xml'), mode='w', encoding='utf-8') as info_file:
+            info_file.write(CONFIG_DUMP_INFO)
+
+    # каждая часть выгружает по файлу на объект из своего списка
+    def run_on_receivers(self, target, tasks: list, queue):
+        for part_conf, list_path, _, _ in tasks:
+            with open(list_path, mode='r', encoding='utf-8-sig') as list_file:
+                names = list_file.read().split()
+            for name in names:
+                kind, object_name = name.split('.')
+                path = os.path.join(part_conf['git']['configuration_src_path'], f'{kind}s', f'{object_name}.xml')
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, mode='w', encoding='utf-8') as dump_file:
+                    dump_file.write(name)
+
+    def test_010_part_receivers_removed(self):
+        with mock.patch.multiple(ConvertStorage, execute_command=self.execute_command,
+                                 run_on_receivers=self.run_on_receivers, dump_config_info_command=mock.DEFAULT):
+            ConvertStorage.parallel_full_dump(self.conf, 1, None)
+        self.assertEqual(sorted(os.listdir(self.src_path)), ['Catalogs', 'ConfigDumpInfo.xml', 'Documents'])
+        self.assertEqual(os.listdir(self.dump_path), ['info'])
+
+    def test_020_part_receivers_removed_after_error(self):
+        with mock.patch.multiple(ConvertStorage, execute_command=self.execute_command,
+                                 run_on_receivers=mock.DEFAULT, dump_config_info_command=mock.DEFAULT) as mocks:
+            mocks['run_on_receivers'].side_effect = ValueError('ошибка выгрузки')
+            with self.assertRaises(ValueError):
+                ConvertStorage.parallel_full_dump(self.conf, 1, None)
+        self.assertEqual(os.listdir(self.dump_path), ['info'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import ConvertStorage
+
+
+class ReceiverPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.pool_path = os.path.join(self.data_path, 'pool')
+        self.receiver_path = os.path.join(self.data_path, 'receiver')
+        self.empty_db_path = os.path.join(self.data_path, 'empty.dt')
+        with open(self.empty_db_path, mode='wb') as dt_file:
+            dt_file.write(b'dt')
+        self.conf = {'onec': {'start_path': '/opt/1cv8/x86_64/8.3.22/1cv8'},
+                     'info_base': {'connection_string': f'File="{self.receiver_path}";',
+                                   'empty_db_path': self.empty_db_path,
+                                   'pool': {'path': self.pool_path, 'size': 2}}}
+        # эталон - папка файловой базы с признаком актуальности
+        self.golden_path = ConvertStorage.get_golden_path(self.conf)
+        self.write_infobase(self.golden_path, b'golden')
+        ConvertStorage.write_json_file(f'{self.golden_path}.json', ConvertStorage.get_golden_stamp(self.conf))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def write_infobase(self, path: str, data: bytes):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, '1Cv8.1CD'), mode='wb') as db_file:
+            db_file.write(data)
+
+    def read_infobase(self, path: str) -> bytes:
+        with open(os.path.join(path, '1Cv8.1CD'), mode='rb') as db_file:
+            return db_file.read()
+
+    def copy_path(self, num: int) -> str:
+        return os.path.join(self.pool_path, f'ready_{num}')
+
+    def test_010_create_pool_copy(self):
+        ConvertStorage.create_pool_copy(self.conf, self.copy_path(0))
+        self.assertEqual(self.read_infobase(self.copy_path(0)), b'golden')
+        self.assertTrue(ConvertStorage.is_pool_copy_actual(self.conf, self.copy_path(0)))
+        # временные папки не остаются
+        self.assertEqual(sorted(os.listdir(self.pool_path)), ['golden', 'golden.json', 'ready_0', 'ready_0.json'])
+
+    def test_020_copy_outdated(self):
+        ConvertStorage.create_pool_copy(self.conf, self.copy_path(0))
+        self.assertFalse(ConvertStorage.is_pool_copy_actual(self.conf, self.copy_path(1)))
+
+        # другая версия платформы
+        conf = dict(self.conf, onec={'start_path': '/opt/1cv8/x86_64/8.3.23/1cv8'})
+        self.assertFalse(ConvertStorage.is_pool_copy_actual(conf, self.copy_path(0)))
+
+        # измененный файл выгрузки пустой базы
+        time.sleep(0.01)
+        with open(self.empty_db_path, mode='wb') as dt_file:
+            dt_file.write(b'new dt')
+        self.assertFalse(ConvertStorage.is_pool_copy_actual(self.conf, self.copy_path(0)))
+        self.assertFalse(ConvertStorage.is_pool_copy_actual(self.conf, self.golden_path))
+
+        # поврежденный файл признака
+        with open(f'{self.golden_path}.json', mode='w') as stamp_file:
+            stamp_file.write('{')
+        self.assertFalse(ConvertStorage.is_pool_copy_actual(self.conf, self.golden_path))
+
+    def test_030_copy_created_by_other_process(self):
+        self.write_infobase(self.copy_path(0), b'other')
+        ConvertStorage.create_pool_copy(self.conf, self.copy_path(0))
+        self.assertEqual(self.read_infobase(self.copy_path(0)), b'other')
+        self.assertFalse(any(name.endswith('.tmp') for name in os.listdir(self.pool_path)))
+
+    def test_040_take_pool_copy(self):
+        self.assertFalse(ConvertStorage.take_pool_copy(self.conf, self.receiver_path))
+        ConvertStorage.create_pool_copy(self.conf, self.copy_path(1))
+        self.write_infobase(self.receiver_path, b'used')
+        self.assertTrue(ConvertStorage.take_pool_copy(self.conf, self.receiver_path))
+        self.assertEqual(self.read_infobase(self.receiver_path), b'golden')
+        self.assertFalse(os.path.exists(self.copy_path(1)))
+        # одна копия выдается только один раз
+        self.assertFalse(ConvertStorage.take_pool_copy(self.conf, self.receiver_path))
+
+    def test_050_outdated_copy_not_taken(self):
+        self.write_infobase(self.copy_path(0), b'old')
+        ConvertStorage.write_json_file(f'{self.copy_path(0)}.json', ['old.dt', 1, 1, ''])
+        self.assertFalse(ConvertStorage.take_pool_copy(self.conf, self.receiver_path))
+        self.assertFalse(os.path.exists(self.receiver_path))
+
+    def test_060_fill_receiver_pool(self):
+        self.write_infobase(self.copy_path(0), b'old')
+        ConvertStorage.write_json_file(f'{self.copy_path(0)}.json', ['old.dt', 1, 1, ''])
+        ConvertStorage.fill_receiver_pool(self.conf)
+        for num in range(2):
+            self.assertTrue(ConvertStorage.is_pool_copy_actual(self.conf, self.copy_path(num)))
+            self.assertEqual(self.read_infobase(self.copy_path(num)), b'golden')
+
+    def test_070_restore_receiver_from_pool(self):
+        ConvertStorage.create_pool_copy(self.conf, self.copy_path(0))
+        with mock.patch.object(ConvertStorage, 'start_fill_receiver_pool') as fill:
+            ConvertStorage.restore_receiver_from_pool(self.conf)
+            self.assertEqual(self.read_infobase(self.receiver_path), b'golden')
+            self.assertFalse(os.path.exists(self.copy_path(0)))
+            # пул пуст: копирование эталона
+            self.write_infobase(self.receiver_path, b'used')
+            ConvertStorage.restore_receiver_from_pool(self.conf)
+            self.assertEqual(self.read_infobase(self.receiver_path), b'golden')
+        self.assertEqual(fill.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
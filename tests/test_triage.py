@@ -0,0 +1,219 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import ConvertStorage
+
+
+CONFIG_DUMP_INFO = '''<?xml version="1.0" encoding="UTF-8"?>
+<ConfigDumpInfo xmlns="http://v8.1c.ru/8.3/xcf/dumpinfo" format="Hierarchical" version="2.15">
+	<ConfigVersions>
+		<Metadata name="Configuration.Конфигурация" id="1" configVersion="a1"/>
+		<Metadata name="Catalog.Товары" id="2" configVersion="b1"/>
+		<Metadata name="Catalog.Товары.Form.ФормаЭлемента" id="3" configVersion="b2"/>
+		<Metadata name="Catalog.Товары.Form.ФормаЭлемента.Form" id="4" configVersion="b3"/>
+		<Metadata name="Document.Заказ" id="5" configVersion="c1"/>
+	</ConfigVersions>
+</ConfigDumpInfo>
+'''
+
+OPTIONS = {'enabled': True, 'small_objects': 2, 'huge_objects': 5}
+
+
+def version_data(changed: list = None, added: list = None) -> dict:
+    return {'Version': '1.0', 'CommitMessage': '', 'Author': 'a', 'CommitDate': '01.02.2022',
+            'CommitTime': '10:00:00', 'ChangedObjects': changed or list(), 'AddedObjects': added or list()}
+
+
+class DumpObjectNameTests(unittest.TestCase):
+
+    def test_010_report_names(self):
+        self.assertEqual(ConvertStorage.get_dump_object_name('Справочник.Товары.Форма.ФормаЭлемента'),
+                         'Catalog.Товары')
+        self.assertEqual(ConvertStorage.get_dump_object_name('Справочник.Товары'), 'Catalog.Товары')
+        self.assertEqual(ConvertStorage.get_dump_object_name('РегистрСведений.Цены.Макет.Печать'),
+                         'InformationRegister.Цены')
+        self.assertEqual(ConvertStorage.get_dump_object_name('ОбщийМодуль.Сервер'), 'CommonModule.Сервер')
+        # имена выгрузки не изменяются
+        self.assertEqual(ConvertStorage.get_dump_object_name('Document.Заказ.Form.Ф'), 'Document.Заказ')
+
+    def test_020_unknown_kind(self):
+        self.assertEqual(ConvertStorage.get_dump_object_name('НеизвестныйВид.Объект'), '')
+        self.assertEqual(ConvertStorage.get_dump_object_name('Конфигурация'), '')
+
+
+class ClassifyVersionTests(unittest.TestCase):
+
+    dump_objects = {'Catalog.Товары': ['Catalog.Товары'], 'Document.Заказ': ['Document.Заказ']}
+
+    def classify(self, data: dict) -> str:
+        return ConvertStorage.classify_version(OPTIONS, data, self.dump_objects)
+
+    def test_010_classes(self):
+        self.assertEqual(self.classify(version_data()), 'empty')
+        self.assertEqual(self.classify(version_data(['Конфигурация', 'Справочник.Товары'])), 'root')
+        self.assertEqual(self.classify(version_data([f'Справочник.С{num}' for num in range(5)])), 'huge')
+        self.assertEqual(self.classify(version_data(['Справочник.Товары.Форма.ФормаЭлемента',
+                                                     'Документ.Заказ'])), 'small')
+
+    def test_020_regular(self):
+        # больше small_objects объектов
+        self.assertEqual(self.classify(version_data(['Справочник.Товары', 'Документ.Заказ',
+                                                     'Справочник.Товары.Форма.Ф'])), 'regular')
+        # добавленные объекты
+        self.assertEqual(self.classify(version_data(['Справочник.Товары'], ['Справочник.Новый'])), 'regular')
+        # объекта нет в текущей выгрузке
+        self.assertEqual(self.classify(version_data(['Справочник.Контрагенты'])), 'regular')
+
+    def test_030_dump_objects_used_only_for_small_versions(self):
+        for data in (version_data(), version_data(['Конфигурация']), version_data(['Справочник.А'], ['Справочник.Б'])):
+            self.assertNotEqual(ConvertStorage.classify_version(OPTIONS, data, None), 'small')
+
+
+class DumpStrategyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.src_path = tempfile.mkdtemp()
+        self.conf = {'triage': OPTIONS, 'git': {'configuration_src_path': self.src_path}}
+        with open(os.path.join(self.src_path, 'ConfigDumpInfo.xml'), mode='w', encoding='utf-8') as info_file:
+            info_file.write(CONFIG_DUMP_INFO)
+
+    def tearDown(self):
+        shutil.rmtree(self.src_path)
+
+    def test_010_without_triage(self):
+        conf = {'git': self.conf['git']}
+        self.assertEqual(ConvertStorage.get_dump_strategy(conf, version_data(), True), ('', 'full'))
+        self.assertEqual(ConvertStorage.get_dump_strategy(conf, version_data(), False), ('', 'incremental'))
+
+    def test_020_strategies(self):
+        small = version_data(['Справочник.Товары.Форма.ФормаЭлемента'])
+        self.assertEqual(ConvertStorage.get_dump_strategy(self.conf, small, False), ('small', 'partial'))
+        self.assertEqual(ConvertStorage.get_dump_strategy(self.conf, version_data(), False), ('empty', 'skip'))
+        huge = version_data([f'Справочник.С{num}' for num in range(5)])
+        self.assertEqual(ConvertStorage.get_dump_strategy(self.conf, huge, False), ('huge', 'full_verify'))
+
+    def test_030_first_dump_is_full(self):
+        cases = [(version_data(['Справочник.Товары']), 'small'), (version_data(['Конфигурация']), 'root'),
+                 (version_data(['Справочник.Контрагенты']), 'regular')]
+        for data, version_class in cases:
+            self.assertEqual(ConvertStorage.get_dump_strategy(self.conf, data, True), (version_class, 'full'))
+        self.assertEqual(ConvertStorage.get_dump_strategy(self.conf, version_data(), True), ('empty', 'skip'))
+
+    def test_040_dump_info_read_only_for_small_versions(self):
+        with mock.patch.object(ConvertStorage, 'read_source_dump_objects',
+                               wraps=ConvertStorage.read_source_dump_objects) as read:
+            ConvertStorage.get_dump_strategy(self.conf, version_data(['Конфигурация']), False)
+            ConvertStorage.get_dump_strategy(self.conf, version_data(['Справочник.А'], ['Справочник.Б']), False)
+            self.assertTrue(ConvertStorage.is_dump_skipped(self.conf, version_data()))
+            self.assertFalse(ConvertStorage.is_dump_skipped(self.conf, version_data(['Справочник.Товары'])))
+            read.assert_not_called()
+            ConvertStorage.get_dump_strategy(self.conf, version_data(['Справочник.Товары']), False)
+            read.assert_called_once()
+
+    def test_050_plan_history(self):
+        extension = {'extension': 'Расш', 'triage': OPTIONS, 'git': self.conf['git']}
+        points = [[(self.conf, 1, version_data()), (extension, 1, version_data(['Справочник.Товары']))],
+                  [(self.conf, 2, version_data(['Справочник.Товары']))],
+                  [(self.conf, 3, version_data(['Справочник.Товары'])), (extension, 2, version_data(['Конфигурация']))]]
+        plan = ConvertStorage.plan_history([self.conf, extension], points)
+        self.assertEqual([(item['source'], item['version'], item['class'], item['strategy']) for item in plan],
+                         [('', 1, 'empty', 'skip'), ('Расш', 1, 'small', 'full'),
+                          ('', 2, 'small', 'full'), ('', 3, 'small', 'partial'),
+                          ('Расш', 2, 'root', 'incremental')])
+        self.assertEqual([item['cost'] for item in plan], [1, 1800, 1800, 60, 300])
+        self.assertEqual(plan[1]['objects'], 1)
+
+
+# частичная выгрузка и проверка полной выгрузки; вместо 1С файлы записывает тест
+class DumpObjectsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.data_path, 'src')
+        self.conf = {'onec': {'work_path': os.path.join(self.data_path, 'work')},
+                     'git': {'configuration_src_path': self.src_path}}
+        self.receiver_info = CONFIG_DUMP_INFO
+        self.commands = list()
+        self.dumped = list()
+        self.write('ConfigDumpInfo.xml', CONFIG_DUMP_INFO.replace('"c1"', '"c0"').replace(
+            '</ConfigVersions>', '\t<Metadata name="Document.Удаленный" id="6" configVersion="d1"/>\n\t</ConfigVersions>'))
+        for path in ('Configuration.xml', 'Catalogs/Товары.xml', 'Catalogs/Товары/Forms/ФормаЭлемента.xml',
+                     'Documents/Заказ.xml', 'Documents/Удаленный.xml'):
+            self.write(path, 'старая выгрузка')
+        self.patcher = mock.patch.multiple(
+            ConvertStorage, execute_command=self.execute_command,
+            dump_config_info_command=lambda conf, path, ver: SimpleNamespace(kind='info', path=path),
+            dump_object_list_command=lambda conf, path, ver, part: SimpleNamespace(kind='list', path=path))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.data_path)
+
+    def write(self, path: str, data: str):
+        full_path = os.path.join(self.src_path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, mode='w', encoding='utf-8') as dump_file:
+            dump_file.write(data)
+
+    def read(self, path: str) -> str:
+        with open(os.path.join(self.src_path, path), mode='r', encoding='utf-8') as dump_file:
+            return dump_file.read()
+
+    def execute_command(self, conf: dict, oc_command):
+        self.commands.append(oc_command.kind)
+        if oc_command.kind == 'info':
+            os.makedirs(oc_command.path)
+            with open(os.path.join(oc_command.path, 'ConfigDumpInfo.xml'), mode='w', encoding='utf-8') as info_file:
+                info_file.write(self.receiver_info)
+            return
+
+        with open(oc_command.path, mode='r', encoding='utf-8-sig') as list_file:
+            names = list_file.read().split()
+        self.dumped.extend(names)
+        for name in names:
+            parts = name.split('.')
+            if len(parts) == 2:
+                self.write(os.path.join(ConvertStorage.METADATA_KIND_DIRS.get(parts[0], f'{parts[0]}s'),
+                                        f'{parts[1]}.xml'), 'новая выгрузка')
+
+    def test_010_partial_dump(self):
+        ConvertStorage.partial_dump(self.conf, 2, ['Справочник.Товары.Форма.ФормаЭлемента'])
+        # ConfigDumpInfo.xml базы-приемника выгружается до объектов
+        self.assertEqual(self.commands, ['info', 'list'])
+        # объект версии и объект с отличающейся версией в ConfigDumpInfo.xml
+        self.assertEqual(sorted(self.dumped), ['Catalog.Товары', 'Catalog.Товары.Form.ФормаЭлемента',
+                                               'Catalog.Товары.Form.ФормаЭлемента.Form', 'Document.Заказ'])
+        self.assertEqual(self.read('Documents/Заказ.xml'), 'новая выгрузка')
+        self.assertEqual(self.read('Configuration.xml'), 'старая выгрузка')
+        self.assertFalse(os.path.exists(os.path.join(self.src_path, 'Documents', 'Удаленный.xml')))
+        self.assertEqual(self.read('ConfigDumpInfo.xml'), CONFIG_DUMP_INFO)
+        self.assertEqual(os.listdir(self.conf['onec']['work_path']), list())
+
+    def test_020_verify_dump(self):
+        self.write('ConfigDumpInfo.xml', CONFIG_DUMP_INFO)
+        ConvertStorage.verify_dump(self.conf, 1)
+        self.assertEqual(self.commands, list())
+
+    def test_030_verify_dump_missing_objects_redumped(self):
+        self.write('ConfigDumpInfo.xml', CONFIG_DUMP_INFO)
+        os.remove(os.path.join(self.src_path, 'Documents', 'Заказ.xml'))
+        ConvertStorage.verify_dump(self.conf, 1)
+        self.assertEqual(self.dumped, ['Document.Заказ'])
+        self.assertEqual(self.read('Documents/Заказ.xml'), 'новая выгрузка')
+
+    def test_040_verify_dump_missing_form(self):
+        self.write('ConfigDumpInfo.xml', CONFIG_DUMP_INFO)
+        shutil.rmtree(os.path.join(self.src_path, 'Catalogs', 'Товары'))
+        # тестовая выгрузка объектов не создает файлы форм
+        with self.assertRaises(ValueError):
+            ConvertStorage.verify_dump(self.conf, 1)
+        self.assertEqual(self.dumped[0], 'Catalog.Товары')
+
+
+if __name__ == '__main__':
+    unittest.main()